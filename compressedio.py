@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Reads files that may be compressed with gzip, bzip2, xz or zstd, detected
+# by their first bytes, without decompressing them to disk. Decompression
+# runs on its own thread, a few chunks ahead of the reader.
+#
+# zstd needs the zstandard package, the other formats are in the standard
+# library.
+
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import sys
+import threading
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+READ_AHEAD_CHUNK_SIZE = 1 << 20
+READ_AHEAD_CHUNKS = 4
+
+GZIP = 'gzip'
+BZIP2 = 'bzip2'
+XZ = 'xz'
+ZSTD = 'zstd'
+
+MAGIC = [
+  (b'\x1f\x8b', GZIP),
+  (b'BZh', BZIP2),
+  (b'\xfd7zXZ\x00', XZ),
+  (b'\x28\xb5\x2f\xfd', ZSTD),
+]
+
+def compression(name):
+  with open(name, 'rb') as f:
+    start = f.read(max([len(magic) for (magic, _) in MAGIC]))
+  for (magic, kind) in MAGIC:
+    if start.startswith(magic):
+      return kind
+  return None
+
+def isCompressed(name):
+  return compression(name) is not None
+
+def openBinary(name):
+  kind = compression(name)
+  if kind is None:
+    return open(name, 'rb', buffering=READ_AHEAD_CHUNK_SIZE)
+  # The decompressed streams own their file, closing them closes it.
+  if kind == GZIP:
+    decompressed = gzip.open(name, 'rb')
+  elif kind == BZIP2:
+    decompressed = bz2.open(name, 'rb')
+  elif kind == XZ:
+    decompressed = lzma.open(name, 'rb')
+  elif kind == ZSTD:
+    if zstandard is None:
+      raise ImportError('%s is compressed with zstd, reading it needs the zstandard package' % name)
+    decompressed = zstandard.ZstdDecompressor().stream_reader(open(name, 'rb'), closefd=True)
+  else:
+    assert False, kind
+  return io.BufferedReader(ReadAhead(decompressed), READ_AHEAD_CHUNK_SIZE)
+
+# Lines end only with '\n', as in logparser.LogSource.
+def openText(name):
+  return io.TextIOWrapper(openBinary(name), encoding='utf-8', newline='\n')
+
+# Yields the lines of the file, without their '\n' or '\r\n' line ends.
+def readLines(name):
+  with openText(name) as f:
+    for line in f:
+      if line.endswith('\n'):
+        line = line[:-1]
+      if line.endswith('\r'):
+        line = line[:-1]
+      yield line
+
+# Reads a stream on a separate thread, keeping up to 'chunks' chunks ahead
+# of the reader.
+class ReadAhead(io.RawIOBase):
+  def __init__(self, f, chunk_size=READ_AHEAD_CHUNK_SIZE, chunks=READ_AHEAD_CHUNKS):
+    self.__f = f
+    self.__chunk_size = chunk_size
+    self.__queue = queue.Queue(chunks)
+    self.__chunk = b''
+    self.__position = 0
+    self.__eof = False
+    self.__stopping = False
+    self.__thread = threading.Thread(target=self.__read, daemon=True)
+    self.__thread.start()
+
+  def readable(self):
+    return True
+
+  def readinto(self, buffer):
+    while self.__position >= len(self.__chunk):
+      if self.__eof:
+        return 0
+      item = self.__queue.get()
+      if isinstance(item, BaseException):
+        self.__eof = True
+        raise item
+      if not item:
+        self.__eof = True
+        return 0
+      self.__chunk = item
+      self.__position = 0
+    size = min(len(buffer), len(self.__chunk) - self.__position)
+    buffer[:size] = self.__chunk[self.__position:self.__position + size]
+    self.__position += size
+    return size
+
+  def close(self):
+    if not self.closed:
+      self.__stopping = True
+      # Unblocks the reading thread if it waits for space in the queue.
+      while self.__thread.is_alive():
+        try:
+          self.__queue.get(timeout=0.1)
+        except queue.Empty:
+          pass
+      self.__f.close()
+    super().close()
+
+  def __read(self):
+    try:
+      while not self.__stopping:
+        chunk = self.__f.read(self.__chunk_size)
+        self.__put(chunk)
+        if not chunk:
+          return
+    except BaseException as e:
+      self.__put(e)
+
+  def __put(self, item):
+    while not self.__stopping:
+      try:
+        self.__queue.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        pass
+
+def main(argv):
+  if len(argv) != 1:
+    print('Usage: compressedio.py file')
+    return
+  for line in readLines(argv[0]):
+    print(line)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
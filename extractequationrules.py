@@ -1,32 +1,38 @@
 #!/usr/bin/env python3
 
+import compressedio
 import filesequence
+import os
+import ruleindex
 import sys
 
 def readFile(name):
-  with open(name, "r") as f:
-    return [l[:len(l) - 1] for l in f]
+  return list(compressedio.readLines(name))
+
+def replaceReferrence(line):
+  last_space = line.rfind(' ')
+  if last_space < 0:
+    return line
+  try:
+    equation = filesequence.findSequenceFromText(line[last_space + 1:], ' ')
+    return '%s%s' % (line[:last_space + 1], equation)
+  except Exception:
+    return line
 
 def replaceReferrences(lines):
-  replaced = []
-  for line in lines:
-    last_space = line.rfind(' ')
-    if last_space < 0:
-      replaced.append(line)
-      continue
-    try:
-      equation = filesequence.findSequenceFromText(line[last_space + 1:], ' ')
-      replaced.append('%s%s' % (line[:last_space + 1], equation))
-    except Exception:
-      replaced.append(line)
-  return replaced
+  return [replaceReferrence(line) for line in lines]
 
 def main(argv):
-  if len(argv) != 1:
-    print('Usage: extract-equation-rules.py log-file')
+  if len(argv) not in (1, 2):
+    print('Usage: extract-equation-rules.py log-file [rule-index]')
     return
-  lines = readFile(argv[0])
-  print('\n'.join(replaceReferrences(lines)))
+  if len(argv) == 2:
+    if not os.path.exists(argv[1]):
+      print('No rule index at %s' % argv[1], file=sys.stderr)
+      sys.exit(1)
+    filesequence.RESOLVER.setIndex(ruleindex.RuleIndex(argv[1]))
+  for line in compressedio.readLines(argv[0]):
+    print(replaceReferrence(line))
 
 if __name__ == "__main__":
     main(sys.argv[1:])
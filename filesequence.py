@@ -1,17 +1,98 @@
 #!/usr/bin/env python3
 
+import mmap
 import sys
 
 def readFile(name):
   with open(name, "r") as f:
     return [l[:len(l) - 1] for l in f]
 
+# A source file mapped in memory, with the offsets at which its lines start.
+class SourceFile(object):
+  def __init__(self, name):
+    with open(name, 'rb') as f:
+      try:
+        self.__data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      except ValueError:
+        # Empty files can't be mapped.
+        self.__data = b''
+    self.__starts = [0]
+    end = self.__data.find(b'\n')
+    while end >= 0:
+      self.__starts.append(end + 1)
+      end = self.__data.find(b'\n', end + 1)
+    if self.__starts[-1] == len(self.__data):
+      self.__starts.pop()
+
+  def lineCount(self):
+    return len(self.__starts)
+
+  # The lines from start_line to end_line, counted from 1, without their
+  # line ends.
+  def lines(self, start_line, end_line):
+    result = []
+    for i in range(max(start_line, 1) - 1, min(end_line, len(self.__starts))):
+      start = self.__starts[i]
+      end = self.__starts[i + 1] if i + 1 < len(self.__starts) else len(self.__data)
+      line = self.__data[start:end].decode('utf-8')
+      if line.endswith('\n'):
+        line = line[:-1]
+      if line.endswith('\r'):
+        line = line[:-1]
+      result.append(line)
+    return result
+
+# Finds sequences in source files, reading each file only once and
+# remembering each sequence that was found.
+#
+# With a ruleindex.RuleIndex, sequences that are indexed sentences are read
+# from the index, the others from the files.
+class SequenceResolver(object):
+  def __init__(self, index=None):
+    self.__files = {}
+    self.__sequences = {}
+    self.__index = index
+
+  def setIndex(self, index):
+    self.__index = index
+    self.__sequences = {}
+
+  def findSequence(self, file_name, start_line, start_column, end_line, end_column, separator):
+    key = (file_name, start_line, start_column, end_line, end_column, separator)
+    sequence = self.__sequences.get(key)
+    if sequence is None:
+      lines = None
+      if self.__index is not None:
+        lines = self.__index.sequence(file_name, start_line, start_column, end_line, end_column)
+      if lines is None:
+        lines = self.file(file_name).lines(start_line, end_line)
+        lines[-1] = lines[-1][:end_column]
+        lines[0] = lines[0][start_column - 1:]
+      sequence = separator.join(lines)
+      self.__sequences[key] = sequence
+    return sequence
+
+  def findSequenceFromText(self, arg, separator):
+    file_name, start_line, start_column, end_line, end_column = parsePosition(arg)
+    return self.findSequence(file_name, start_line, start_column, end_line, end_column, separator)
+
+  # Files that can't be read are not tried again.
+  def file(self, file_name):
+    if file_name not in self.__files:
+      try:
+        self.__files[file_name] = SourceFile(file_name)
+      except OSError:
+        self.__files[file_name] = None
+        raise
+    source = self.__files[file_name]
+    if source is None:
+      raise FileNotFoundError(file_name)
+    return source
+
+RESOLVER = SequenceResolver()
+
 def findSequence(file_name, start_line, start_column, end_line, end_column, separator):
-  lines = readFile(file_name)
-  lines = lines[start_line - 1:end_line]
-  lines[-1] = lines[-1][:end_column]
-  lines[0] = lines[0][start_column - 1:]
-  return separator.join(lines)
+  return RESOLVER.findSequence(file_name, start_line, start_column, end_line, end_column, separator)
 
 def parsePosition(arg):
   separator = arg.find(':')
@@ -33,8 +114,7 @@ def parsePosition(arg):
   return (file_name, start_line, start_column, end_line, end_column)
 
 def findSequenceFromText(arg, separator):
-  file_name, start_line, start_column, end_line, end_column = parsePosition(arg)
-  return findSequence(file_name, start_line, start_column, end_line, end_column, separator)
+  return RESOLVER.findSequenceFromText(arg, separator)
 
 def main(argv):
   if len(argv) != 1:
@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 
+import bisect
+import functools
+import re
 import sys
 
+import konfig
+
 INDENT_SIZE = 2
 
 INDENTS = [' ' * (indent * INDENT_SIZE) for indent in range(0, 100)]
@@ -25,38 +30,90 @@ def transformTraversal(level, lines, visitor):
     return visited
   return retv
 
-def splitOutsideParentheses(s, substr):
-  open_r = 0
-  open_s = 0
-  open_c = 0
-  start = 0
-  retv = []
-  end = s.find(substr, start)
-  pos = start
-  while end >= 0:
-    while pos < end:
-      if s[pos] == '(':
+class BracketIndex(object):
+  OPEN = {'(': ')', '[': ']', '{': '}'}
+  CHARACTERS = re.compile(r'[()\[\]{},]')
+
+  def __init__(self, s):
+    # Only bracket positions are stored, the depth between two of them is
+    # constant.
+    self.__positions = []
+    self.__depths = []
+    self.__opens = []
+    self.__matches = {}
+    # Opening brackets whose scan reaches a mismatched closing bracket.
+    self.__broken = set()
+
+    open_r = 0
+    open_s = 0
+    open_c = 0
+    stack = []
+    for m in BracketIndex.CHARACTERS.finditer(s):
+      pos = m.start()
+      current = s[pos]
+      if current == ',':
+        if stack:
+          stack[-1][2].append(pos + 1)
+        continue
+      if current == '(':
         open_r += 1
-      elif s[pos] == '[':
+      elif current == '[':
         open_s += 1
-      elif s[pos] == '{':
+      elif current == '{':
         open_c += 1
-      elif s[pos] == ')':
+      elif current == ')':
         open_r -= 1
-      elif s[pos] == ']':
+      elif current == ']':
         open_s -= 1
-      elif s[pos] == '}':
+      elif current == '}':
         open_c -= 1
-      pos += 1
+      self.__positions.append(pos)
+      self.__depths.append(abs(open_r) + abs(open_s) + abs(open_c))
+
+      if current in BracketIndex.OPEN:
+        self.__opens.append(pos)
+        self.__matches[pos] = None
+        stack.append((current, pos, []))
+      elif stack:
+        (open, start, split_points) = stack.pop()
+        if BracketIndex.OPEN[open] != current:
+          self.__broken.add(start)
+          self.__broken.update([p for (_, p, _) in stack])
+          continue
+        self.__matches[start] = (start, pos, split_points)
+
+  # Returns True if all brackets in s[:pos] are closed.
+  def isTopLevel(self, pos):
+    i = bisect.bisect_left(self.__positions, pos) - 1
+    return i < 0 or self.__depths[i] == 0
+
+  def findPair(self, start):
+    i = bisect.bisect_left(self.__opens, start)
+    if i >= len(self.__opens):
+      return None
+    first = self.__opens[i]
+    assert first not in self.__broken, first
+    return self.__matches[first]
+
+@functools.lru_cache(maxsize=256)
+def bracketIndex(s):
+  return BracketIndex(s)
+
+def splitOutsideParentheses(s, substr):
+  index = bracketIndex(s)
+  start = 0
+  retv = []
+  end = s.find(substr, start)
+  while end >= 0:
     next = end + len(substr)
-    if open_r == 0 and open_s == 0 and open_c == 0:
+    if index.isTopLevel(end):
       retv.append(s[start:end])
       start = next
     end = s.find(substr, next)
   retv.append(s[start:])
   return retv
 
-def splitKCell(max_len, level, lines):
+def findKCell(lines):
   if type(lines) != list:
     return None
   if len(lines) < 3:
@@ -68,22 +125,27 @@ def splitKCell(max_len, level, lines):
     return None
   assert i + 2 < len(lines)
   assert lines[i+2] == '</k>', lines[i+2]
+  assert type(lines[i+1]) == list, lines[i+1]
+  return i
+
+def splitKCellLine(max_len, level, line):
+  if type(line) != str:
+    return [line]
+  if len(line) + level * INDENT_SIZE < max_len:
+    return [line]
+  if not ' ~> ' in line:
+    return [line]
+  split = splitOutsideParentheses(line, ' ~> ')
+  return [split[0]] + ['~> ' + s for s in split[1:]]
+
+def splitKCell(max_len, level, lines):
+  i = findKCell(lines)
+  if i is None:
+    return None
   retv = lines[:i+1]
   retv_line = []
-  assert type(lines[i+1]) == list, lines[i+1]
   for line in lines[i+1]:
-    if type(line) != str:
-      retv_line.append(line)
-      continue
-    if len(line) + level * INDENT_SIZE < max_len:
-      retv_line.append(line)
-      continue
-    if not ' ~> ' in line:
-      retv_line.append(line)
-      continue
-    split = splitOutsideParentheses(line, ' ~> ')
-    retv_line.append(split[0])
-    retv_line += ['~> ' + s for s in split[1:]]
+    retv_line += splitKCellLine(max_len, level, line)
   retv.append(retv_line)
 
   retv += lines[i+2:]
@@ -120,34 +182,7 @@ def replaceNewLine(line):
   return [line.replace('\n', ' ')]
 
 def findParenthesesPair(s, start):
-  while start < len(s) and s[start] not in '([{':
-    start += 1
-  if start >= len(s):
-    return None
-  open = [s[start]]
-  split_points = []
-  end = start + 1
-  while end < len(s) and open:
-    current = s[end]
-    end += 1
-    if current == ',':
-      if len(open) == 1:
-        split_points.append(end)
-    elif current == ')':
-      assert open[-1] == '('
-      open.pop()
-    elif current == ']':
-      assert open[-1] == '['
-      open.pop()
-    elif current == '}':
-      assert open[-1] == '{'
-      open.pop()
-    elif current in '([{':
-      open.append(current)
-
-  if open:
-    return None
-  return (start, end - 1, split_points)
+  return bracketIndex(s).findPair(start)
 
 def onlySpaces(start, end, str):
   for i in range(start, end + 1):
@@ -218,43 +253,121 @@ def removeEmptyLines(item):
     return None
   return []
 
+SPLIT_ON_OPERATORS = [
+  lambda max_len, level, l: splitOnStringWithPrefix(False, " ~> ", "~> ", max_len, level, l),
+  lambda max_len, level, l: splitNewline(max_len, level, l),
+  lambda max_len, level, l: splitOnStringWithPrefix(False, " :=: ", ":=: ", max_len, level, l),
+  lambda max_len, level, l: splitOnStringWithPrefix(True, " +Int ", "+Int ", max_len, level, l),
+  lambda max_len, level, l: splitOnStringWithPrefix(True, " >Int ", ">Int ", max_len, level, l),
+  lambda _, __, l: strip(l),
+]
+
+SPLIT_ON_PARENTHESES = [
+  lambda max_len, level, l: splitParentheses(max_len, level, l),
+  lambda _, __, l: strip(l),
+]
+
+# Everything that split() does after splitKCell. These passes only look at
+# a single line and at what was produced from it, so they can also be applied
+# to one line at a time.
+SPLIT_PASSES = (
+    [lambda _, __, l: strip(l)]
+    + SPLIT_ON_OPERATORS + SPLIT_ON_PARENTHESES
+    + SPLIT_ON_OPERATORS + SPLIT_ON_PARENTHESES
+    + SPLIT_ON_OPERATORS + SPLIT_ON_PARENTHESES
+    + SPLIT_ON_OPERATORS
+    + [ lambda _, __, l: replaceNewLine(l),
+        lambda _, __, l: removeEmptyLines(l),
+      ]
+  )
+
 def split(lines, max_len):
   lines = transformTraversal(0, lines, lambda level, l: splitKCell(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " ~> ", "~> ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitNewline(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " :=: ", ":=: ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " +Int ", "+Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " >Int ", ">Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda level, l: splitParentheses(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " ~> ", "~> ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitNewline(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " :=: ", ":=: ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " +Int ", "+Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " >Int ", ">Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda level, l: splitParentheses(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " ~> ", "~> ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitNewline(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " :=: ", ":=: ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " +Int ", "+Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " >Int ", ">Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda level, l: splitParentheses(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " ~> ", "~> ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitNewline(max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(False, " :=: ", ":=: ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " +Int ", "+Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda level, l: splitOnStringWithPrefix(True, " >Int ", ">Int ", max_len, level, l))
-  lines = transformTraversal(0, lines, lambda _, l: strip(l))
-  lines = transformTraversal(0, lines, lambda _, l: replaceNewLine(l))
-  lines = transformTraversal(0, lines, lambda _, l: removeEmptyLines(l))
+  for split_pass in SPLIT_PASSES:
+    lines = transformTraversal(0, lines, lambda level, l: split_pass(max_len, level, l))
   return lines
 
+def splitLine(max_len, level, line):
+  lines = [line]
+  for split_pass in SPLIT_PASSES:
+    lines = transformTraversal(level, lines, lambda level, l: split_pass(max_len, level, l))
+  return lines
+
+# Produces the same lines as unparse(0, split(lines, max_len), output), but
+# lazily, formatting a konfig line only when the output reaches it.
+#
+# Yields (line, cell) pairs. When a line opens a cell, cell is a
+# (path, collapsed) pair, otherwise it is None. isCollapsed(path, contents)
+# decides which cells are shown on a single line, their contents are never
+# formatted. When laying out a single cell, root is its path in the konfig.
+#
+# Each konfig line is formatted with formatter(max_len, indent, line), which
+# has the same result as formatLine. If it returns None, the line is not
+# available yet and a placeholder is shown instead.
+def layout(lines, max_len, isCollapsed=lambda path, contents: False, root=None, formatter=None):
+  if formatter is None:
+    formatter = formatLine
+  context = LayoutContext(max_len, konfig.CellPaths(root), isCollapsed, formatter)
+  return layoutList(0, 0, lines, None, '', context)
+
+class LayoutContext:
+  def __init__(self, max_len, paths, isCollapsed, formatter):
+    self.max_len = max_len
+    self.paths = paths
+    self.isCollapsed = isCollapsed
+    self.formatter = formatter
+
+def layoutList(level, indent, lines, kcell_level, parent, context):
+  k_index = findKCell(lines)
+  if k_index is not None:
+    # splitKCell wraps the list containing <k> into another list.
+    indent += 1
+  i = 0
+  while i < len(lines):
+    item = lines[i]
+    if type(item) == list:
+      if k_index is not None and i == k_index + 1:
+        yield from layoutList(level + 1, indent + 1, item, level, parent, context)
+      else:
+        yield from layoutList(level + 1, indent + 1, item, None, parent, context)
+      i += 1
+      continue
+
+    cell = None
+    name = konfig.cellName(lines, i)
+    if name is not None:
+      path = context.paths.path(parent, name)
+      if context.isCollapsed(path, lines[i + 1]):
+        yield ('%s%s ... %s' % (INDENTS[indent], name, lines[i + 2]), (path, True))
+        i += 3
+        continue
+      cell = (path, False)
+      yield from layoutItem(indent, item, kcell_level, cell, context)
+      yield from layoutList(level + 1, indent + 1, lines[i + 1], level if i == k_index else None, path, context)
+      i += 2
+      continue
+
+    yield from layoutItem(indent, item, kcell_level, cell, context)
+    i += 1
+
+def layoutItem(indent, item, kcell_level, cell, context):
+  if kcell_level is None:
+    pieces = [item]
+  else:
+    pieces = splitKCellLine(context.max_len, kcell_level, item)
+  for piece in pieces:
+    output = context.formatter(context.max_len, indent, piece)
+    if output is None:
+      output = ['%s[formatting %d characters]' % (INDENTS[indent], len(piece))]
+    for line in output:
+      yield (line, cell)
+      cell = None
+
+def formatLine(max_len, indent, line):
+  output = []
+  unparse(indent, splitLine(max_len, indent, line), output)
+  return output
+
 def unparse(indent, lines, output):
   for item in lines:
     if type(item) == list:
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
 import curses
 import curses.ascii
+import multiprocessing
 import os
 import subprocess
 import sys
@@ -150,8 +152,8 @@ class Handler:
     else:
       self.__next_node_state = prooftree.Node.PROOF_END
 
-  def onKonfig(self, node_id, konfig_lines):
-    self.__node_tree.findNode(node_id).setKonfig(konfig_lines)
+  def onKonfig(self, node_id, konfig_lines, cell_index):
+    self.__node_tree.findNode(node_id).setKonfig(konfig_lines, cell_index)
 
   def onGraph(self):
     self.__ui_graph.setGraph(graph.parseGraph(graphFile()))
@@ -266,9 +268,9 @@ def communicateWithParser(stderr, life, parser):
       continue
     parser.process(a)
 
-def communicate(process, log, end_state, handler, life, message_thread, error_handler):
+def communicate(process, log, end_state, handler, life, message_thread, pool, error_handler):
   stdErrParser = output.StdErrParser(end_state, log, message_thread)
-  stdOutParser = output.OutputParser(handler, log, message_thread)
+  stdOutParser = output.OutputParser(handler, log, message_thread, pool)
 
   handler.setParsers([stdOutParser, stdErrParser])
 
@@ -330,6 +332,10 @@ class ConnectEverything:
       self.__ui_message_thread.add(lambda: self.__windows.currentWindow_UI().end_UI())
     elif c == ord(' '):
       self.__ui_message_thread.add(lambda: self.__windows.currentWindow_UI().space_UI())
+    elif c == ord('s'):
+      self.__ui_message_thread.add(lambda: self.__windows.currentWindow_UI().select_UI())
+    elif c == ord('p'):
+      self.__ui_message_thread.add(lambda: self.__windows.currentWindow_UI().project_UI())
     elif c == curses.ascii.TAB:
       self.__ui_message_thread.add(self.__windows.tab_UI)
     elif c == curses.KEY_BTAB:
@@ -365,6 +371,11 @@ def main(argv, live, error_handler, stdscr):
 
   runProcessWatcher(live, error_handler, p)
 
+  # Konfig normalization and layout are pure functions of their input, they
+  # run here so that they block neither the parsers nor the UI.
+  pool = concurrent.futures.ProcessPoolExecutor(
+      mp_context=multiprocessing.get_context('spawn'))
+
   end_state = EndState()
   handler = Handler(p.stdin, log, message_thread, live, end_state)
 
@@ -374,6 +385,7 @@ def main(argv, live, error_handler, stdscr):
       handler.graph(),
       ui_message_thread,
       message_thread,
+      pool,
       handler,
       assertOnUIThread)
   d.update()
@@ -388,7 +400,7 @@ def main(argv, live, error_handler, stdscr):
   ui_message_thread.add(keyboard_reader.maybeReadKey_UI)
 
   try:
-    communicate(p, log, end_state, handler, live, message_thread, error_handler)
+    communicate(p, log, end_state, handler, live, message_thread, pool, error_handler)
     while live.isRunning():
       try:
         p.wait(1)
@@ -399,6 +411,7 @@ def main(argv, live, error_handler, stdscr):
         debug.append('kore-repl exited with code %d.' % exit_code)
   finally:
     p.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
   try:
@@ -5,6 +5,10 @@ import sys
 def normalize(lines):
   return transform(parse(lines))
 
+def normalizeAndIndex(lines):
+  normalized = normalize(lines)
+  return (normalized, CellIndex(normalized))
+
 def transformTraversal(lines, visitor):
   retv = []
 
@@ -119,6 +123,112 @@ def parseLevelled(lines):
 
   return parsed
 
+def cellName(lines, i):
+  item = lines[i]
+  if type(item) != str or not item.startswith('<') or not item.endswith('>'):
+    return None
+  if item.startswith('</'):
+    return None
+  if i + 2 >= len(lines) or type(lines[i + 1]) != list:
+    return None
+  if lines[i + 2] != '</' + item[1:]:
+    return None
+  return item
+
+def cellSize(contents):
+  size = 0
+  to_visit = [contents]
+  while to_visit:
+    for item in to_visit.pop():
+      if type(item) == list:
+        to_visit.append(item)
+      else:
+        size += len(item)
+  return size
+
+def containsCells(contents):
+  to_visit = [contents]
+  while to_visit:
+    lines = to_visit.pop()
+    for i in range(0, len(lines)):
+      if type(lines[i]) == list:
+        to_visit.append(lines[i])
+      elif cellName(lines, i) is not None:
+        return True
+  return False
+
+# Names cells like '<generatedTop>/<k>'. Cells with the same name inside the
+# same parent cell get a '#<count>' suffix, in the order in which they are
+# named.
+#
+# If root is given, it is used as the path of the top-level cell.
+class CellPaths:
+  def __init__(self, root=None):
+    self.__seen = {}
+    self.__root = root
+
+  def path(self, parent, name):
+    if not parent and self.__root is not None:
+      return self.__root
+    if parent:
+      path = '%s/%s' % (parent, name)
+    else:
+      path = name
+    count = self.__seen.get(path, 0)
+    self.__seen[path] = count + 1
+    if count:
+      return '%s#%d' % (path, count)
+    return path
+
+# Maps cell paths, named as in CellPaths, to the ['<name>', contents, '</name>']
+# part of a normalized konfig.
+#
+# Also records the size of the cells that do not contain other cells, as
+# cellSize would compute it, so that it is computed once per konfig.
+class CellIndex:
+  def __init__(self, lines):
+    self.__cells = {}
+    # Cell path -> cellSize of its contents, for cells without inner cells.
+    self.__leaf_sizes = {}
+    self.__add('', lines, CellPaths())
+
+  def cell(self, path):
+    return self.__cells.get(path)
+
+  def paths(self):
+    return list(self.__cells.keys())
+
+  # The size of the cell's contents if it does not contain other cells,
+  # otherwise None.
+  def leafSize(self, path):
+    return self.__leaf_sizes.get(path)
+
+  # Returns (size, contains cells) for the lines.
+  def __add(self, parent, lines, paths):
+    size = 0
+    contains_cells = False
+    for i in range(0, len(lines)):
+      if type(lines[i]) == list:
+        if i > 0 and cellName(lines, i - 1) is not None:
+          # Already indexed together with its cell.
+          continue
+        (child_size, child_cells) = self.__add(parent, lines[i], paths)
+        size += child_size
+        contains_cells = contains_cells or child_cells
+        continue
+      size += len(lines[i])
+      name = cellName(lines, i)
+      if name is None:
+        continue
+      contains_cells = True
+      path = paths.path(parent, name)
+      self.__cells[path] = lines[i:i + 3]
+      (child_size, child_cells) = self.__add(path, lines[i + 1], paths)
+      if not child_cells:
+        self.__leaf_sizes[path] = child_size
+      size += child_size
+    return (size, contains_cells)
+
 def main(argv):
   print(normalize([
     '    true',
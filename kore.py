@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# A lightweight kore tokenizer, for measuring and comparing the kore terms
+# in logs without parsing them.
+#
+#     Lbl'Plus'Int{}(VarX:SortInt{}, \dv{SortInt{}}("1"))
+#
+# Identifiers between braces are sorts, as are those after the ':' of a
+# variable. The other identifiers are symbols or variables, a variable being
+# an identifier followed by ':'.
+
+import hashlib
+import re
+import sys
+
+TOKEN = re.compile(r'''"(?:[^"\\]|\\.)*"|[\\@]?[A-Za-z][A-Za-z0-9'\-]*|[(){},:]''')
+
+def tokenize(text):
+  return TOKEN.findall(text)
+
+# Yields the (token, kind) pairs of the text, kind being 'symbol', 'variable',
+# 'string', 'sort' or None for punctuation.
+def classify(text):
+  tokens = tokenize(text)
+  depth = 0
+  after_colon = False
+  for (i, token) in enumerate(tokens):
+    if token == '{':
+      depth += 1
+      kind = None
+    elif token == '}':
+      depth -= 1
+      kind = None
+    elif token in ('(', ')', ',', ':'):
+      kind = None
+    elif depth > 0 or after_colon:
+      kind = 'sort'
+    elif token.startswith('"'):
+      kind = 'string'
+    elif i + 1 < len(tokens) and tokens[i + 1] == ':':
+      kind = 'variable'
+    else:
+      kind = 'symbol'
+    after_colon = token == ':'
+    yield (token, kind)
+
+# The number of symbols, variables and string literals in the text.
+def nodeCount(text):
+  return sum([1 for (_, kind) in classify(text) if kind in ('symbol', 'variable', 'string')])
+
+# The tokens of the text with variables renamed in the order in which they
+# first occur, so that terms which differ only in their variable names have
+# the same normal form.
+def normalize(text):
+  names = {}
+  result = []
+  for (token, kind) in classify(text):
+    if kind == 'variable':
+      name = names.get(token)
+      if name is None:
+        name = 'V%d' % len(names)
+        names[token] = name
+      token = name
+    result.append(token)
+  return ' '.join(result)
+
+# A short hash of the normal form, equal for terms that differ only in their
+# variable names.
+def normalizedHash(text):
+  return hashlib.blake2b(normalize(text).encode('utf-8'), digest_size=16).hexdigest()
+
+def main(argv):
+  if len(argv) != 1:
+    print('Usage: kore.py kore-file')
+    return
+  with open(argv[0], 'r') as f:
+    text = f.read()
+  print('nodes: %d' % nodeCount(text))
+  print('hash: %s' % normalizedHash(text))
+  print(normalize(text))
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
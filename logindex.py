@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+# Indexes the entries of a kore-rpc or kore-repl log in a SQLite database,
+# so that questions about the log do not require parsing it again.
+#
+#     logindex.py index LOG DATABASE
+#     logindex.py query DATABASE [--equation LOCATION] [--type TYPE] ...
+#     logindex.py contexts DATABASE [--match TEXT]
+#
+# Only the entry structure is stored, kore terms are read from the log when
+# a query asks for them with --kore.
+
+import argparse
+import os
+import sqlite3
+import sys
+
+import logparser
+
+SCHEMA = '''
+    CREATE TABLE source (
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL
+    );
+    CREATE TABLE contexts (
+        id INTEGER PRIMARY KEY,
+        parent INTEGER,
+        line TEXT NOT NULL
+    );
+    CREATE TABLE entries (
+        id INTEGER PRIMARY KEY,
+        type TEXT NOT NULL,
+        file TEXT,
+        start_line INTEGER,
+        start_column INTEGER,
+        location TEXT,
+        context INTEGER,
+        parent INTEGER,
+        start INTEGER NOT NULL,
+        end INTEGER NOT NULL
+    );
+'''
+
+INDEXES = '''
+    CREATE INDEX contexts_parent ON contexts (parent);
+    CREATE INDEX entries_location ON entries (start_line, start_column);
+    CREATE INDEX entries_type ON entries (type);
+    CREATE INDEX entries_context ON entries (context);
+    CREATE INDEX entries_parent ON entries (parent);
+'''
+
+BATCH_SIZE = 10000
+
+# The equation an entry is about: the attempted one for DebugAttemptEquation,
+# the one whose attempt contains the entry for the other entries.
+def entryLocation(entry):
+    if isinstance(entry, logparser.DebugAttemptEquation):
+        return entry.equationLocation()
+    context = entry.context()
+    if not context:
+        return None
+    [last] = context.suffix(len(context) - 1)
+    if isinstance(last, logparser.DebugAttemptEquationContext):
+        return last.location()
+    return None
+
+class ContextIds(object):
+    def __init__(self, db):
+        self.__db = db
+        self.__ids = {}
+
+    def id(self, context):
+        if context is None:
+            return None
+        parent = None
+        for line in context.lines():
+            key = (parent, line)
+            current = self.__ids.get(key)
+            if current is None:
+                current = len(self.__ids) + 1
+                self.__ids[key] = current
+                self.__db.execute(
+                    'INSERT INTO contexts (id, parent, line) VALUES (?, ?, ?)',
+                    (current, parent, line))
+            parent = current
+        return parent
+
+def index(log_path, db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    db = sqlite3.connect(db_path)
+    db.executescript(SCHEMA)
+    contexts = ContextIds(db)
+    with open(log_path, 'rb') as f:
+        source = logparser.LogSource(f)
+        stat = os.stat(log_path)
+        db.execute(
+            'INSERT INTO source (path, size, mtime) VALUES (?, ?, ?)',
+            (source.path(), stat.st_size, stat.st_mtime))
+
+        builder = logparser.TreeBuilder()
+        # Row ids of the entries whose children are still being read.
+        open_ids = []
+        rows = []
+        for (row_id, lines) in enumerate(source.entryLines(), 1):
+            entry = logparser.LogEntry.parse(lines)
+            assert entry is not None, lines
+            parent_level = builder.add(entry)
+            # Organizing the finished entries checks their structure and lets
+            # the builder drop them.
+            for _ in builder.takeOrganized(1):
+                pass
+
+            del open_ids[parent_level:]
+            parent = open_ids[-1] if open_ids else None
+            if entry.context() is not None:
+                open_ids.append(row_id)
+
+            location = entryLocation(entry)
+            if location is None:
+                location_row = (None, None, None, None)
+            else:
+                location_row = (
+                    location.fileName(), location.startLine(),
+                    location.startColumn(), str(location))
+            rows.append(
+                (row_id, type(entry).__name__)
+                + location_row
+                + (contexts.id(entry.context()), parent, lines.starts[0], lines.end()))
+            if len(rows) >= BATCH_SIZE:
+                insertEntries(db, rows)
+                rows = []
+        insertEntries(db, rows)
+        builder.finish()
+        for _ in builder.takeOrganized(0):
+            pass
+    db.executescript(INDEXES)
+    db.commit()
+    db.close()
+
+def insertEntries(db, rows):
+    db.executemany(
+        '''INSERT INTO entries
+            (id, type, file, start_line, start_column, location, context, parent, start, end)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        rows)
+
+def openIndex(db_path):
+    assert os.path.exists(db_path), db_path
+    db = sqlite3.connect(db_path)
+    (path, size, mtime) = db.execute('SELECT path, size, mtime FROM source').fetchone()
+    if os.path.exists(path):
+        stat = os.stat(path)
+        if stat.st_size != size or stat.st_mtime != mtime:
+            print('Warning: %s changed after it was indexed.' % path, file=sys.stderr)
+    return (db, path)
+
+def query(db_path, equation, entry_type, context, parent, kore, limit):
+    (db, log_path) = openIndex(db_path)
+    conditions = []
+    arguments = []
+    prefix = ''
+    if equation is not None:
+        location = logparser.FileLocation.parse(equation)
+        # The log has absolute paths, the file name may be given relative to
+        # any of their parents. Unlike LIKE, substr has no wildcards and is
+        # case sensitive.
+        conditions.append('start_line = ? AND start_column = ? AND (file = ? OR substr(file, -length(?) - 1) = ?)')
+        arguments += [location.startLine(), location.startColumn(), location.fileName(), location.fileName(), '/' + location.fileName()]
+    if entry_type is not None:
+        conditions.append('type = ?')
+        arguments.append(entry_type)
+    if context is not None:
+        prefix = '''
+            WITH RECURSIVE under(id) AS (
+                SELECT ?
+                UNION ALL
+                SELECT contexts.id FROM contexts JOIN under ON contexts.parent = under.id
+            )'''
+        arguments = [context] + arguments
+        conditions.append('context IN under')
+    if parent is not None:
+        conditions.append('parent = ?')
+        arguments.append(parent)
+    sql = '%s SELECT id, type, location, context, parent, start, end FROM entries' % prefix
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY id'
+    if limit is not None:
+        sql += ' LIMIT %d' % limit
+
+    source = None
+    if kore:
+        with open(log_path, 'rb') as f:
+            source = logparser.LogSource(f)
+    for (entry_id, t, location, context_id, parent_id, start, end) in db.execute(sql, arguments):
+        print('%d %s %s context=%s parent=%s bytes=%d-%d' % (entry_id, t, location or '-', context_id, parent_id, start, end))
+        if source is not None:
+            for line in source.read(start, end).split('\n'):
+                print('    ' + line.rstrip('\r'))
+    db.close()
+
+def contexts(db_path, match):
+    (db, _) = openIndex(db_path)
+    if match is None:
+        rows = db.execute('SELECT id, parent, line FROM contexts ORDER BY id')
+    else:
+        rows = db.execute(
+            'SELECT id, parent, line FROM contexts WHERE instr(line, ?) > 0 ORDER BY id',
+            (match,))
+    for (context_id, parent, line) in rows:
+        print('%d parent=%s %s' % (context_id, parent, line))
+    db.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='logindex.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = commands.add_parser('index', help='index a log')
+    index_parser.add_argument('log')
+    index_parser.add_argument('database')
+
+    query_parser = commands.add_parser('query', help='list the indexed entries')
+    query_parser.add_argument('database')
+    query_parser.add_argument(
+        '--equation',
+        help='entries about the equation at this location, e.g. foo.k:326:8')
+    query_parser.add_argument(
+        '--type', dest='entry_type',
+        help='entry type, e.g. EquationIsNotApplicableRequirement')
+    query_parser.add_argument(
+        '--context', type=int,
+        help='entries whose context is this context id or extends it')
+    query_parser.add_argument('--parent', type=int, help='children of this entry id')
+    query_parser.add_argument(
+        '--kore', action='store_true',
+        help='also print the entries, read from the log')
+    query_parser.add_argument('--limit', type=int)
+
+    contexts_parser = commands.add_parser('contexts', help='list the context ids')
+    contexts_parser.add_argument('database')
+    contexts_parser.add_argument('--match', help='only contexts whose line contains this text')
+
+    args = parser.parse_args(argv)
+    if args.command == 'index':
+        index(args.log, args.database)
+    elif args.command == 'query':
+        query(args.database, args.equation, args.entry_type, args.context, args.parent, args.kore, args.limit)
+    elif args.command == 'contexts':
+        contexts(args.database, args.match)
+    else:
+        assert False, args.command
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,86 +1,351 @@
 #!/usr/bin/env python3
 
+import argparse
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import json
+import mmap
+import os
+import re
 import sys
+import time
+import weakref
+
+import compressedio
+import filesequence
+import kore
+import ruleindex
 
 INDENT = '    '
 CONTEXT_PREFIX = '('
 CONTEXT = 'Context:'
 
+# More chunks than processes, so that a slow chunk does not keep the other
+# processes idle.
+CHUNKS_PER_JOB = 4
+
+# Seconds between two checks for new lines with --follow.
+FOLLOW_INTERVAL = 1
+
+# Bytes buffered before writing to the output file.
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Bytes of a LogSource decoded at once when reading its lines.
+READ_BLOCK_SIZE = 1 << 20
+
+# Raised for log text that does not have the structure the parsers expect.
+class ParseError(ValueError):
+    pass
+
+def expect(condition, *details):
+    if not condition:
+        raise ParseError(repr(list(details)))
+
+# Raises a ParseError unless lines[index] is 'expected'.
+def expectLine(lines, index, expected):
+    if index >= len(lines) or lines[index] != expected:
+        raise ParseError(repr([expected, lines[index:index + 1]]))
+
+LEADING_SPACES = re.compile(r' *')
+LEADING_SPACE_BYTES = re.compile(rb' *')
+
+# The lines of an entry read from a LogSource, which know where they start in
+# the source: line i is the line at offset starts[i], possibly without some
+# of its leading spaces. Slices keep the offsets, so that kore_text can turn
+# the lines of a kore term back into a KoreText without keeping offsets in
+# each line.
+class SourceLines(list):
+    __slots__ = ('source', 'starts')
+
+    def __init__(self, lines, source, starts):
+        list.__init__(self, lines)
+        self.source = source
+        self.starts = starts
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            return SourceLines(list.__getitem__(self, index), self.source, self.starts[index])
+        return list.__getitem__(self, index)
+
+    # The end of the last line in the source.
+    def end(self):
+        return self.source.lineEnd(self.starts[-1])
+
+    # The number of leading spaces removed from line i.
+    def removed(self, i):
+        line_spaces = LEADING_SPACES.match(list.__getitem__(self, i)).end()
+        return self.source.indentation(self.starts[i]) - line_spaces
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+# A log file mapped in memory, so that entries can keep offsets into it
+# instead of copies of their kore terms.
+#
+# Sources are pickled as their path, entries parsed in another process use
+# the source of the current process for the same file.
+class LogSource(object):
+    OPEN = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def forPath(path):
+        source = LogSource.OPEN.get(path)
+        if source is None:
+            with open(path, 'rb') as f:
+                source = LogSource(f)
+        return source
+
+    def __init__(self, f):
+        self.__path = os.path.abspath(f.name)
+        self.__map(f)
+        LogSource.OPEN[self.__path] = self
+
+    def path(self):
+        return self.__path
+
+    # Maps the bytes appended to the file since it was mapped.
+    def grow(self):
+        with open(self.__path, 'rb') as f:
+            self.__map(f)
+
+    # The end of the last complete line after start, or start if there is
+    # none.
+    def completeLinesEnd(self, start):
+        end = self.__data.rfind(b'\n', start)
+        if end < 0:
+            return start
+        return end + 1
+
+    # The SourceLines of the entries between the two offsets. Lines are
+    # decoded by blocks which end after a '\n', so that they never split a
+    # character.
+    def entryLines(self, start=0, end=None):
+        size = len(self.__data)
+        if end is not None:
+            size = end
+        lines = []
+        starts = []
+        while start < size:
+            block_end = self.__data.rfind(b'\n', start, min(start + READ_BLOCK_SIZE, size)) + 1
+            if block_end <= start:
+                block_end = self.__data.find(b'\n', start, size) + 1
+                if block_end <= start:
+                    block_end = size
+            text = self.read(start, block_end)
+            # Lengths in characters are lengths in bytes for ASCII blocks.
+            ascii = len(text) == block_end - start
+            for line in text.split('\n'):
+                line_start = start
+                start += (len(line) if ascii else len(line.encode('utf-8'))) + 1
+                if not line:
+                    continue
+                if line[-1] == '\r':
+                    line = line[:-1]
+                    if not line:
+                        continue
+                # isEntryHeader, inlined.
+                if lines and not line.startswith(INDENT) and not line.startswith(CONTEXT):
+                    yield SourceLines(lines, self, starts)
+                    lines = []
+                    starts = []
+                lines.append(line)
+                starts.append(line_start)
+            start = block_end
+        if lines:
+            yield SourceLines(lines, self, starts)
+
+    # The end of the line at offset start, without its '\r\n'.
+    def lineEnd(self, start):
+        end = self.__data.find(b'\n', start)
+        if end < 0:
+            end = len(self.__data)
+        if end > start and self.__data[end - 1] == ord('\r'):
+            end -= 1
+        return end
+
+    # The number of spaces at the start of the line at offset start.
+    def indentation(self, start):
+        return LEADING_SPACE_BYTES.match(self.__data, start).end() - start
+
+    def read(self, start, end):
+        return self.__data[start:end].decode('utf-8')
+
+    # Splits the source in about 'count' (start, end) ranges which start at
+    # entries with a top-level context, so that parseEntries can read them
+    # independently, and so that they contain whole top-level entries.
+    def chunks(self, count):
+        size = len(self.__data)
+        starts = [0]
+        for i in range(1, count):
+            start = self.__topLevelEntryStart(max(size * i // count, starts[-1]))
+            if start >= size:
+                break
+            if start > starts[-1]:
+                starts.append(start)
+        return list(zip(starts, starts[1:] + [size]))
+
+    # The start of the first entry with a top-level context at or after the
+    # line containing pos.
+    def __topLevelEntryStart(self, pos):
+        start = self.__data.rfind(b'\n', 0, pos) + 1
+        for lines in self.entryLines(start):
+            if not isEntryHeader(lines[0]):
+                continue
+            context = entryContext(lines, tolerant=True)
+            if context is not None and context.isTopLevel():
+                return lines.starts[0]
+        return len(self.__data)
+
+    def __map(self, f):
+        if f.seek(0, 2) == 0:
+            self.__data = b''
+        else:
+            self.__data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __reduce__(self):
+        return (LogSource.forPath, (self.__path,))
+
+# Reads the lines of a log that is still being written. Each time it reaches
+# the end of the log, it calls the idle listeners and waits for new lines.
+# Lines are read only once they are complete, and reading stops on Ctrl-C,
+# as if the log ended there.
+class LogFollower(object):
+    def __init__(self, source, interval=FOLLOW_INTERVAL):
+        self.__source = source
+        self.__interval = interval
+        self.__idle_listeners = []
+
+    def addIdleListener(self, listener):
+        self.__idle_listeners.append(listener)
+
+    # Yields the SourceLines of the entries. The last entry read may go on in
+    # lines that are not written yet, so it is read again with them.
+    def entryLines(self):
+        start = 0
+        read = 0
+        while True:
+            end = self.__source.completeLinesEnd(read)
+            if end > read:
+                last = None
+                for lines in self.__source.entryLines(start, end):
+                    if last is not None:
+                        yield last
+                    last = lines
+                start = end if last is None else last.starts[0]
+                read = end
+                continue
+            try:
+                for listener in self.__idle_listeners:
+                    listener()
+                time.sleep(self.__interval)
+            except KeyboardInterrupt:
+                yield from self.__source.entryLines(start, read)
+                return
+            self.__source.grow()
+
+# The lines of a kore term, read from the source only when needed.
+class KoreText(object):
+    def __init__(self, source, start, end, strip):
+        self.__source = source
+        self.__start = start
+        self.__end = end
+        self.__strip = strip
+
+    def lines(self):
+        result = []
+        for line in self.__source.read(self.__start, self.__end).split('\n'):
+            if line.endswith('\r'):
+                line = line[:-1]
+            if not line:
+                # Skipped when reading the entries.
+                continue
+            result.append(line[self.__strip:])
+        return result
+
+    def __iter__(self):
+        return iter(self.lines())
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return repr(self.lines())
+
+# Replaces the lines of a kore term read from a LogSource by a KoreText.
+# Other lines, e.g. those of a string given to parse(), are kept as they are.
+#
+# The lines of a term are stripped of the same prefixes, made of spaces, so
+# only the first and the last lines are checked.
+def kore_text(lines):
+    if not lines or not isinstance(lines, SourceLines):
+        return lines
+    removed = lines.removed(0)
+    if lines.removed(len(lines) - 1) != removed:
+        return list(lines)
+    return KoreText(lines.source, lines.starts[0], lines.end(), removed)
+
 def remove_prefix(lines, prefix, allowed):
     result = []
     for l in lines:
         if l.startswith(prefix):
             l = l[len(prefix):]
         else:
-            assert l.startswith(allowed), [l, prefix, allowed]
+            expect(l.startswith(allowed), l, prefix, allowed)
         result.append(l)
+    if isinstance(lines, SourceLines):
+        return SourceLines(result, lines.source, lines.starts)
     return result
 
 def extract_indented(lines, start):
     current = start
-    while current < len(lines):
-        if not lines[current].startswith(INDENT):
-            return (current, lines[start:current])
+    # Iterating does not go through SourceLines.__getitem__.
+    for line in itertools.islice(lines, start, None):
+        if not line.startswith(INDENT):
+            break
         current += 1
     return (current, lines[start:current])
 
-def extract_inner_entries(entries, start, context_size):
-    current = start
-    while current < len(entries):
-        context = entries[current].context()
-        if context is not None:
-            if  (   len(entries[current].context()) <= context_size
-                or  is_top_level(entries[current].context())
-                ):
-                return (current, entries[start:current])
-        current += 1
-    return (current, entries[start:current])
-
-def is_top_level(context):
-    for c in context:
-        if not isinstance(c, GenericContext):
-            return False
-    return True
-
-def checkContextPrefixList(entry, children):
+def checkContextPrefix(entry, child):
     entry_context = entry.context()
-    for child in children:
-        child_context = child.context()
-        if child_context is not None:
-            assert len(entry_context) < len(child_context), [entry_context, child_context]
-            for (ec, cc) in zip(entry_context, child_context):
-                assert ec == cc, [ec, cc, entry_context, child_context]
+    child_context = child.context()
+    expect(entry_context.isStrictPrefixOf(child_context), entry_context, child_context)
 
 def checkSameContext(entry1, entry2):
     context1 = entry1.context()
     context2 = entry2.context()
-    assert(len(context1) == len(context2)), [context2, context2]
-    for (ec, cc) in zip(context1, context2):
-        assert ec == cc, [ec, cc, context1, context2]
+    if context2 is None:
+        # DebugApplyEquation entries do not have a context.
+        return
+    expect(context1 is context2, context1, context2)
 
 class FileLocation(object):
     @staticmethod
     def parse(line):
-        end = line.find(':')
-        assert end >= 0, [line]
-        file_name = line[:end]
-        end1 = line.find(':', end + 1)
-        assert end1 >= 0, [line]
-        start_line = int(line[end + 1: end1])
-        end = end1
-        end1 = line.find('-', end + 1)
-        if end1 >= 0:
-            assert end1 >= 0, [line]
-            start_column = int(line[end + 1: end1])
-            end = end1
+        try:
+            end = line.find(':')
+            expect(end >= 0, line)
+            file_name = line[:end]
             end1 = line.find(':', end + 1)
-            assert end1 >= 0, [line]
-            end_line = int(line[end + 1: end1])
-            end_column = int(line[end1 + 1:])
-        else:
-            start_column = int(line[end + 1:])
-            end_line = -1
-            end_column = -1
+            expect(end1 >= 0, line)
+            start_line = int(line[end + 1: end1])
+            end = end1
+            end1 = line.find('-', end + 1)
+            if end1 >= 0:
+                start_column = int(line[end + 1: end1])
+                end = end1
+                end1 = line.find(':', end + 1)
+                expect(end1 >= 0, line)
+                end_line = int(line[end + 1: end1])
+                end_column = int(line[end1 + 1:])
+            else:
+                start_column = int(line[end + 1:])
+                end_line = -1
+                end_column = -1
+        except ValueError:
+            # Also the numbers that int() rejects.
+            raise ParseError(repr([line]))
         return FileLocation(file_name, start_line, start_column, end_line, end_column)
 
     def __init__(self, file_name, start_line, start_column, end_line, end_column):
@@ -90,6 +355,21 @@ class FileLocation(object):
         self.__end_line = end_line
         self.__end_column = end_column
 
+    def fileName(self):
+        return self.__file_name
+
+    def startLine(self):
+        return self.__start_line
+
+    def startColumn(self):
+        return self.__start_column
+
+    def endLine(self):
+        return self.__end_line
+
+    def endColumn(self):
+        return self.__end_column
+
     def __repr__(self) -> str:
         return str(self)
 
@@ -118,16 +398,12 @@ class Context(object):
 
     @classmethod
     def parse(cls, line):
-        assert line.startswith(CONTEXT_PREFIX), [line]
+        expect(line.startswith(CONTEXT_PREFIX), line)
         type_end = line.find(')')
-        assert type_end >= 0
-        assert type_end + 1 < len(line)
-        assert line[type_end + 1] == ' '
+        expect(type_end >= 0 and type_end + 1 < len(line) and line[type_end + 1] == ' ', line)
         t = line[len(CONTEXT_PREFIX):type_end]
-        if t in cls.entries():
-            return cls.entries()[t](line[type_end + 2:])
-        assert False, [t]
-        return GenericContext.parse(line[type_end + 2:])
+        expect(t in cls.entries(), t)
+        return cls.entries()[t](line[type_end + 2:])
 
     def __repr__(self):
         return "'%s'" % str(self)
@@ -155,23 +431,119 @@ class DebugAttemptEquationContext(Context):
     @classmethod
     def parse(cls, line):
         # 'while applying equation at /home/virgil/.cache/bazel/_bazel_virgil/c0f96c7174abcbf704b5e389be3783a0/sandbox/linux-sandbox/1/execroot/__main__/protocol-correctness/proof/execution-proof-helpers.k:326:8-330:64'
-        assert line.startswith(cls.LINE_PREFIX), [line]
+        expect(line.startswith(cls.LINE_PREFIX), line)
 
         location = FileLocation.parse(line[len(cls.LINE_PREFIX):])
-        assert location is not None
         return DebugAttemptEquationContext(location)
 
     def __init__(self, location):
         self.__location = location
 
+    def location(self):
+        return self.__location
+
     def __str__(self):
         return "Applying equation at: %s" % self.__location
 
     def write(self, out):
         out.append(str(self))
 
+# A context, i.e. the list of Context objects found after 'Context:' in an
+# entry. Contexts are interned in a trie: a context is the child of the
+# context without its last item, and is created only once while some entry
+# uses it, so equal contexts are the same object and shared prefixes are
+# stored once.
+#
+# Contexts are pickled as their lines and interned again when unpickled.
+class ContextNode(object):
+    IDS = itertools.count()
+
+    @staticmethod
+    def fromLines(lines):
+        context = ContextNode.ROOT
+        for line in lines:
+            context = context.child(line)
+        return context
+
+    def __init__(self, parent, line):
+        self.__id = next(ContextNode.IDS)
+        self.__parent = parent
+        self.__children = weakref.WeakValueDictionary()
+        self.__line = line
+        if parent is None:
+            self.__context = None
+            self.__depth = 0
+            self.__is_top_level = True
+        else:
+            self.__context = Context.parse(line)
+            assert self.__context is not None
+            self.__depth = parent.__depth + 1
+            self.__is_top_level = parent.__is_top_level and isinstance(self.__context, GenericContext)
+
+    def child(self, line):
+        child = self.__children.get(line)
+        if child is None:
+            line = str(line)
+            child = ContextNode(self, line)
+            self.__children[line] = child
+        return child
+
+    def id(self):
+        return self.__id
+
+    def parent(self):
+        return self.__parent
+
+    def isTopLevel(self):
+        return self.__is_top_level
+
+    def ancestor(self, depth):
+        assert 0 <= depth <= self.__depth
+        node = self
+        while node.__depth > depth:
+            node = node.__parent
+        return node
+
+    def isStrictPrefixOf(self, other):
+        return self.__depth < other.__depth and other.ancestor(self.__depth) is self
+
+    # The Context objects starting at index 'start'.
+    def suffix(self, start):
+        items = []
+        node = self
+        while node.__depth > start:
+            items.append(node.__context)
+            node = node.__parent
+        items.reverse()
+        return items
+
+    def lines(self):
+        lines = []
+        node = self
+        while node.__parent is not None:
+            lines.append(node.__line)
+            node = node.__parent
+        lines.reverse()
+        return lines
+
+    def __len__(self):
+        return self.__depth
+
+    def __iter__(self):
+        return iter(self.suffix(0))
+
+    def __repr__(self):
+        return repr(self.suffix(0))
+
+    def __reduce__(self):
+        return (ContextNode.fromLines, (self.lines(),))
+
+ContextNode.ROOT = ContextNode(None, None)
+
 class LogEntry(object):
     ENTRIES = {}
+    # The number between brackets in the entry header, if any.
+    __timestamp = None
 
     @classmethod
     def entries(cls):
@@ -189,7 +561,7 @@ class LogEntry(object):
 
     @classmethod
     def parse(cls, lines):
-        assert lines
+        expect(lines)
         if lines[0].startswith('  kore-rpc'):
             lines = remove_prefix(lines, '  ', CONTEXT)
         if lines[0].startswith('  kore-repl'):
@@ -199,12 +571,29 @@ class LogEntry(object):
         if not lines[0].endswith('):'):
             return None
         type_start = lines[0].rfind('(')
-        assert type_start >= 0
+        expect(type_start >= 0, lines[0])
         t = lines[0][type_start + 1:-2]
-        if t in cls.entries():
-            return cls.entries()[t](remove_prefix(lines[1:], INDENT, CONTEXT))
-        assert False, [t]
-        return GenericLogEntry(lines[1:])
+        expect(t in cls.entries(), t)
+        entry = cls.entries()[t](remove_prefix(lines[1:], INDENT, CONTEXT))
+        entry.__timestamp = headerTimestamp(lines[0])
+        return entry
+
+    # Parses the entry, or returns a GenericLogEntry if it has an unknown
+    # type or if it can't be parsed.
+    @classmethod
+    def parseTolerant(cls, lines):
+        try:
+            entry = cls.parse(lines)
+            reason = 'not an entry header'
+        except ParseError:
+            entry = None
+            reason = 'could not parse'
+        if entry is not None:
+            return entry
+        entry_type = headerType(lines[0])
+        if entry_type is not None and entry_type not in cls.entries():
+            reason = 'unknown entry type'
+        return GenericLogEntry(lines, entry_type, reason)
 
     def write(self, out):
         assert False, type(self)
@@ -212,21 +601,24 @@ class LogEntry(object):
     def context(self):
         assert False, type(self)
 
+    def timestamp(self):
+        return self.__timestamp
+
 class DebugApplyEquation(LogEntry):
     APPLIED_PREFIX = 'applied equation at '
 
     @staticmethod
     def parse(lines):
-        assert lines
+        expect(lines)
 
         current_line = 0
-        assert not lines[current_line].startswith(CONTEXT_PREFIX)
-        assert lines[current_line].startswith(DebugApplyEquation.APPLIED_PREFIX)
+        expect(not lines[current_line].startswith(CONTEXT_PREFIX), lines[current_line])
+        expect(lines[current_line].startswith(DebugApplyEquation.APPLIED_PREFIX), lines[current_line])
         current_line += 1
         kore = lines[current_line:]
         kore = remove_prefix(kore, INDENT, CONTEXT)
-        assert kore
-        return DebugApplyEquation(kore)
+        expect(kore, lines)
+        return DebugApplyEquation(kore_text(kore))
 
     def __init__(self, kore):
         self.__kore = kore
@@ -243,43 +635,39 @@ class DebugAttemptEquation(LogEntry):
 
     @staticmethod
     def parse(lines):
-        assert lines
+        expect(lines)
 
         current_line = 0
-        while lines[current_line].startswith(CONTEXT_PREFIX):
+        while current_line < len(lines) and lines[current_line].startswith(CONTEXT_PREFIX):
             # c = Context.parse(lines[current_line])
             # assert c is not None
             # context.append(c)
             current_line += 1
-        assert current_line < len(lines)
+        expect(current_line < len(lines), lines)
 
         context_start = current_line
-        while context_start < len(lines):
-            if lines[context_start].startswith(CONTEXT):
+        for line in itertools.islice(lines, current_line, None):
+            if line.startswith(CONTEXT):
                 break
             context_start += 1
-        assert context_start < len(lines)
-        context = []
-        for line in lines[context_start + 1 : ]:
-            c = Context.parse(line)
-            assert c is not None
-            context.append(c)
+        expect(context_start < len(lines), lines)
+        context = ContextNode.fromLines(lines[context_start + 1 : ])
 
         if lines[current_line].startswith(DebugAttemptEquation.APPLY_PREFIX):
-            assert lines[current_line].endswith(DebugAttemptEquation.APPLY_SUFFIX)
+            expect(lines[current_line].endswith(DebugAttemptEquation.APPLY_SUFFIX), lines[current_line])
             file_location = FileLocation.parse(lines[current_line][len(DebugAttemptEquation.APPLY_PREFIX):-len(DebugAttemptEquation.APPLY_SUFFIX)])
             current_line += 1
 
             kore = remove_prefix(lines[current_line:context_start], INDENT, CONTEXT)
-            assert kore
-            return DebugAttemptEquation(context, file_location, kore)
+            expect(kore, lines)
+            return DebugAttemptEquation(context, file_location, kore_text(kore))
         elif lines[current_line].startswith(EquationIsApplicable.PREFIX):
             return EquationIsApplicable(context)
         elif lines[current_line].startswith(EquationIsNotApplicable.PREFIX):
             current_line += 1
             return EquationIsNotApplicable.parse(context, lines[current_line:context_start])
         else:
-            assert False, [lines[current_line]]
+            raise ParseError(repr([lines[current_line]]))
 
     def __init__(self, context, equation_location, term_kore):
         self.__context = context
@@ -316,13 +704,14 @@ class EquationIsNotApplicable(LogEntry):
     def parse(context, lines):
         current_line = 0
 
+        expect(lines)
         if lines[current_line].startswith(EquationIsNotApplicableRequirement.EQUATION_REQUIREMENT_PREFIX):
             return EquationIsNotApplicableRequirement.parse(context, lines)
         if lines[current_line].startswith(EquationIsNotApplicableMatch.EQUATION_MATCH_PREFIX):
             return EquationIsNotApplicableMatch.parse(context, lines)
         if lines[current_line].startswith(EquationIsNotApplicableApplyMatch.EQUATION_MATCH_PREFIX):
             return EquationIsNotApplicableApplyMatch.parse(context, lines)
-        assert False, [lines[current_line]]
+        raise ParseError(repr([lines[current_line]]))
 
     # def __init__(self, context):
     #     self.__context = context
@@ -345,60 +734,56 @@ class EquationIsNotApplicableRequirement(EquationIsNotApplicable):
     def parse(context, lines):
         current_line = 0
 
-        assert(lines[current_line] == EquationIsNotApplicableRequirement.EQUATION_REQUIREMENT_PREFIX), lines[current_line]
+        expectLine(lines, current_line, EquationIsNotApplicableRequirement.EQUATION_REQUIREMENT_PREFIX)
         current_line += 1
         (current_line, equation_kore) = extract_indented(lines, current_line)
         equation_kore = remove_prefix(equation_kore, INDENT, CONTEXT)
 
-        assert(lines[current_line] == EquationIsNotApplicableRequirement.MATCHING_REQUIREMENT_PREFIX), lines[current_line]
+        expectLine(lines, current_line, EquationIsNotApplicableRequirement.MATCHING_REQUIREMENT_PREFIX)
         current_line += 1
         (current_line, matching_kore) = extract_indented(lines, current_line)
         matching_kore = remove_prefix(matching_kore, INDENT, CONTEXT)
 
-        assert(lines[current_line] == EquationIsNotApplicableRequirement.SIDE_CONDITION_PREFIX), lines[current_line]
+        expectLine(lines, current_line, EquationIsNotApplicableRequirement.SIDE_CONDITION_PREFIX)
         current_line += 1
         (current_line, side_condition) = extract_indented(lines, current_line)
 
         side_condition = remove_prefix(side_condition, INDENT, CONTEXT)
         current_side = 0
 
-        assert current_side < len(side_condition), [side_condition, current_side]
-        assert(side_condition[current_side] == EquationIsNotApplicableRequirement.ACTUAL_SIDE_CONDITION_PREFIX), side_condition[current_side]
+        expectLine(side_condition, current_side, EquationIsNotApplicableRequirement.ACTUAL_SIDE_CONDITION_PREFIX)
         current_side += 1
         (current_side, side_condition_kore) = extract_indented(side_condition, current_side)
         side_condition_kore = remove_prefix(side_condition_kore, INDENT, CONTEXT)
 
-        assert current_side < len(side_condition), [side_condition, current_side]
-        assert(side_condition[current_side] == EquationIsNotApplicableRequirement.TERM_REPLACEMENTS_PREFIX), side_condition[current_side]
+        expectLine(side_condition, current_side, EquationIsNotApplicableRequirement.TERM_REPLACEMENTS_PREFIX)
         current_side += 1
         (current_side, term_replacements) = extract_indented(side_condition, current_side)
         term_replacements = remove_prefix(term_replacements, INDENT, CONTEXT)
 
-        assert current_side < len(side_condition), [side_condition, current_side]
-        assert(side_condition[current_side] == EquationIsNotApplicableRequirement.PREDICATE_REPLACEMENTS_PREFIX), side_condition[current_side]
+        expectLine(side_condition, current_side, EquationIsNotApplicableRequirement.PREDICATE_REPLACEMENTS_PREFIX)
         current_side += 1
         (current_side, predicate_replacements) = extract_indented(side_condition, current_side)
         predicate_replacements = remove_prefix(predicate_replacements, INDENT, CONTEXT)
 
-        assert current_side < len(side_condition), [side_condition, current_side]
-        assert(side_condition[current_side] == EquationIsNotApplicableRequirement.DEFINED_PREFIX), side_condition[current_side]
+        expectLine(side_condition, current_side, EquationIsNotApplicableRequirement.DEFINED_PREFIX)
         current_side += 1
         (current_side, defined_terms) = extract_indented(side_condition, current_side)
         defined_terms = remove_prefix(defined_terms, INDENT, CONTEXT)
 
-        assert(lines[current_line] == EquationIsNotApplicableRequirement.NEGATED_IMPLICATION_PREFIX), lines[current_line]
+        expectLine(lines, current_line, EquationIsNotApplicableRequirement.NEGATED_IMPLICATION_PREFIX)
         current_line += 1
         (current_line, negated_implication) = extract_indented(lines, current_line)
         negated_implication = remove_prefix(negated_implication, INDENT, CONTEXT)
 
-        assert current_line == len(lines), [current_line, lines[current_line], lines]
+        expect(current_line == len(lines), lines)
 
         return EquationIsNotApplicableRequirement(
             context,
-            equation_kore,
-            matching_kore,
-            side_condition_kore, term_replacements, predicate_replacements, defined_terms,
-            negated_implication)
+            kore_text(equation_kore),
+            kore_text(matching_kore),
+            kore_text(side_condition_kore), kore_text(term_replacements), kore_text(predicate_replacements), kore_text(defined_terms),
+            kore_text(negated_implication))
 
     def __init__(self, context, equation_kore, matching_kore, side_condition_kore, term_replacements, predicate_replacements, defined_terms, negated_implication):
         self.__context = context
@@ -442,14 +827,14 @@ class EquationIsNotApplicableMatch(EquationIsNotApplicable):
     def parse(context, lines):
         current_line = 0
 
-        assert (lines[current_line].startswith(EquationIsNotApplicableMatch.EQUATION_MATCH_PREFIX)), [lines[current_line]]
-        reason = lines[current_line][len(EquationIsNotApplicableMatch.EQUATION_MATCH_PREFIX) + 1].strip()
+        expect(lines[current_line].startswith(EquationIsNotApplicableMatch.EQUATION_MATCH_PREFIX), lines[current_line])
+        reason = lines[current_line][len(EquationIsNotApplicableMatch.EQUATION_MATCH_PREFIX) + 1:].strip()
         current_line += 1
 
         if current_line != len(lines):
             if lines[current_line].startswith(CONTEXT):
                 current_line = len(lines)
-        assert current_line == len(lines), [current_line, lines[current_line], lines]
+        expect(current_line == len(lines), lines)
 
         return EquationIsNotApplicableMatch(context, reason)
 
@@ -470,13 +855,13 @@ class EquationIsNotApplicableApplyMatch(EquationIsNotApplicable):
     def parse(context, lines):
         current_line = 0
 
-        assert lines[current_line].startswith(EquationIsNotApplicableApplyMatch.EQUATION_MATCH_PREFIX), lines[current_line]
+        expect(lines[current_line].startswith(EquationIsNotApplicableApplyMatch.EQUATION_MATCH_PREFIX), lines[current_line])
         current_line += 1
 
         (current_line, reasons) = extract_indented(lines, current_line)
         reasons = remove_prefix(reasons, INDENT, CONTEXT)
 
-        assert current_line == len(lines), [current_line, lines[current_line], lines]
+        expect(current_line == len(lines), lines)
 
         return EquationIsNotApplicableApplyMatch(context, reasons)
 
@@ -493,7 +878,7 @@ class EquationIsNotApplicableApplyMatch(EquationIsNotApplicable):
 class LogMessage(LogEntry):
     @staticmethod
     def parse(lines):
-        assert lines
+        expect(lines)
         return LogMessage(lines)
 
     def __init__(self, lines):
@@ -503,62 +888,159 @@ class LogMessage(LogEntry):
         return None
 
 
-class LogJsonRpcServer(LogEntry):
-    @staticmethod
-    def parse(lines):
-        assert lines
-        return LogJsonRpcServer(lines)
+# A JSON-RPC server entry, e.g.
+#     Received request {"jsonrpc":"2.0","id":1,"method":"execute",...}
+#     Process request 1 execute
+#     Sending response {"jsonrpc":"2.0","id":1,"result":...}
+# The request id and method are read from the JSON payload when there is one,
+# otherwise from the text. The payload size is in characters.
+class JsonRpcEntry(LogEntry):
+    JSON_ID = re.compile(r'"id"\s*:\s*(?:"([^"]*)"|(-?\d+))')
+    JSON_METHOD = re.compile(r'"method"\s*:\s*"([^"]*)"')
+    TEXT_REQUEST = re.compile(r'\brequest\s+(?:id\s*)?[#:]?\s*"?([\w.-]+)"?[:,]?(?:\s+([A-Za-z][\w/.-]*))?', re.IGNORECASE)
+    JSON_DECODER = json.JSONDecoder()
 
     def __init__(self, lines):
         self.__lines = lines
+        text = ' '.join([line.strip() for line in lines])
+        payload_start = text.find('{')
+        if payload_start < 0:
+            payload = ''
+        else:
+            payload = text[payload_start:]
+            text = text[:payload_start]
+        self.__payload_size = len(payload)
+        self.__request_id = None
+        self.__method = None
+        message = JsonRpcEntry.decode(payload)
+        if message is not None:
+            # Only the top-level keys, params and results may have their own.
+            request_id = message.get('id')
+            if isinstance(request_id, (str, int)) and not isinstance(request_id, bool):
+                self.__request_id = str(request_id)
+            if isinstance(message.get('method'), str):
+                self.__method = message['method']
+            self.__is_response = 'result' in message or 'error' in message
+        else:
+            m = JsonRpcEntry.JSON_ID.search(payload)
+            if m:
+                self.__request_id = m.group(1) if m.group(1) is not None else m.group(2)
+            m = JsonRpcEntry.JSON_METHOD.search(payload)
+            if m:
+                self.__method = m.group(1)
+            self.__is_response = (
+                '"result"' in payload or '"error"' in payload
+                or 'response' in text.lower())
+        m = JsonRpcEntry.TEXT_REQUEST.search(text)
+        if m:
+            if self.__request_id is None:
+                self.__request_id = m.group(1)
+            if self.__method is None:
+                self.__method = m.group(2)
+
+    # The JSON object at the start of the payload, or None if it is not one,
+    # e.g. when it was truncated.
+    @staticmethod
+    def decode(payload):
+        if not payload:
+            return None
+        try:
+            (message, _) = JsonRpcEntry.JSON_DECODER.raw_decode(payload)
+        except ValueError:
+            return None
+        if not isinstance(message, dict):
+            return None
+        return message
 
     def context(self):
         return None
 
-class InfoJsonRpcProcessRequest(LogEntry):
+    def requestId(self):
+        return self.__request_id
+
+    def method(self):
+        return self.__method
+
+    def payloadSize(self):
+        return self.__payload_size
+
+    def isResponse(self):
+        return self.__is_response
+
+class LogJsonRpcServer(JsonRpcEntry):
+    @staticmethod
+    def parse(lines):
+        expect(lines)
+        return LogJsonRpcServer(lines)
+
+class InfoJsonRpcProcessRequest(JsonRpcEntry):
     @staticmethod
     def parse(lines):
-        assert lines
+        expect(lines)
         return InfoJsonRpcProcessRequest(lines)
 
+# A rewrite step entry, listing the rewrite rules attempted or applied, e.g.
+#     The rules at following locations were applied:
+#       /path/to/file.k:12:3-14:30
+# Lines with kore terms are not searched for locations.
+class RewriteRulesEntry(LogEntry):
+    LOCATION = re.compile(r'([^\s:()"]+\.\w+):(\d+):(\d+)(?:-(\d+):(\d+))?')
+
     def __init__(self, lines):
         self.__lines = lines
+        self.__locations = []
+        seen = set()
+        for line in lines:
+            if '{' in line:
+                continue
+            for m in RewriteRulesEntry.LOCATION.finditer(line):
+                if m.group(4) is None:
+                    location = FileLocation(m.group(1), int(m.group(2)), int(m.group(3)), -1, -1)
+                else:
+                    location = FileLocation(
+                        m.group(1), int(m.group(2)), int(m.group(3)),
+                        int(m.group(4)), int(m.group(5)))
+                if str(location) not in seen:
+                    seen.add(str(location))
+                    self.__locations.append(location)
 
     def context(self):
         return None
 
-class DebugAttemptedRewriteRules(LogEntry):
+    def ruleLocations(self):
+        return self.__locations
+
+class DebugAttemptedRewriteRules(RewriteRulesEntry):
     @staticmethod
     def parse(lines):
-        assert lines
+        expect(lines)
         return DebugAttemptedRewriteRules(lines)
 
-    def __init__(self, lines):
-        self.__lines = lines
-
-    def context(self):
-        return None
-
-class DebugAppliedRewriteRules(LogEntry):
+class DebugAppliedRewriteRules(RewriteRulesEntry):
     @staticmethod
     def parse(lines):
-        assert lines
+        expect(lines)
         return DebugAppliedRewriteRules(lines)
 
-    def __init__(self, lines):
-        self.__lines = lines
-
-    def context(self):
-        return None
-
 class GenericLogEntry(LogEntry):
     @staticmethod
     def parse(lines):
-        assert lines
+        expect(lines)
         return GenericLogEntry(lines)
 
-    def __init__(self, lines):
+    def __init__(self, lines, entry_type=None, reason=None):
         self.__lines = lines
+        self.__entry_type = entry_type
+        self.__reason = reason
+
+    def context(self):
+        return None
+
+    def entryType(self):
+        return self.__entry_type
+
+    def reason(self):
+        return self.__reason
 
 class Organized(object):
     @staticmethod
@@ -569,63 +1051,112 @@ class Organized(object):
             if start < len(entries):
                 (next_entry, next_children) = entries[start]
                 if isinstance(next_entry, DebugApplyEquation):
-                    assert not next_children
-                    assert children
-                    assert isinstance(children[-1].main_entry(), EquationIsApplicable)
+                    expect(not next_children)
+                    expect(children)
+                    expect(isinstance(children[-1].main_entry(), EquationIsApplicable))
                     checkSameContext(entry, next_entry)
                     start += 1
                     return (start, OrganizedAppliedEquation(entry, children[:-1], children[-1], next_entry))
 
-            assert children, [entry]
+            expect(children, entry)
             if isinstance(children[-1].main_entry(), EquationIsNotApplicableApplyMatch):
                 return (start, OrganizedNotAppliedEquationApplyMatch(entry, children[:-1], children[-1])) # 
             if isinstance(children[-1].main_entry(), EquationIsNotApplicableRequirement):
                 return (start, OrganizedNotAppliedEquationRequirement(entry, children[:-1], children[-1]))
             if isinstance(children[-1].main_entry(), EquationIsNotApplicableMatch):
-                assert len(children) == 1
+                expect(len(children) == 1)
                 return (start, OrganizedNotAppliedEquationMatch(entry, children[0]))
-            assert False, [entry, children[-1].main_entry()]
+            raise ParseError(repr([entry, children[-1].main_entry()]))
         elif isinstance(entry, EquationIsNotApplicableMatch):
-            assert not children
+            expect(not children)
             return (start, OrganizedSimple('Matching failed', entry, 'Failure computation:', children))
         elif isinstance(entry, EquationIsNotApplicableApplyMatch):
             return (start, OrganizedSimple('Failing to apply match', entry, 'Failure computation:', children))
         elif isinstance(entry, EquationIsNotApplicableRequirement):
-            assert not children
+            expect(not children)
             return (start, OrganizedSimple('Requirement failed', entry, 'Failure computation:', children))
         elif isinstance(entry, EquationIsApplicable):
-            assert not children
+            expect(not children)
             return (start, OrganizedSimple('Success', entry, 'Success computation:', children))
         elif isinstance(entry, LogMessage):
-            assert not children, [children]
+            expect(not children, children)
             return (start, OrganizedSimple('LogMessage', entry, 'No children:', children))
         elif isinstance(entry, LogJsonRpcServer):
-            assert not children, [children]
+            expect(not children, children)
             return (start, OrganizedSimple('LogJsonRpcServer', entry, 'No children:', children))
         elif isinstance(entry, InfoJsonRpcProcessRequest):
-            assert not children, [children]
+            expect(not children, children)
             return (start, OrganizedSimple('InfoJsonRpcProcessRequest', entry, 'No children:', children))
         elif isinstance(entry, DebugAttemptedRewriteRules):
-            assert not children, [children]
+            expect(not children, children)
             return (start, OrganizedSimple('DebugAttemptedRewriteRules', entry, 'No children:', children))
         elif isinstance(entry, DebugAppliedRewriteRules):
-            assert not children, [children]
+            expect(not children, children)
             return (start, OrganizedSimple('DebugAppliedRewriteRules', entry, 'No children:', children))
         elif isinstance(entry, DebugApplyEquation):
-            assert not children, [children]
+            expect(not children, children)
             return (start, OrganizedSimple('DebugApplyEquation', entry, 'No children:', children))
+        elif isinstance(entry, GenericLogEntry):
+            expect(not children, children)
+            return (start, OrganizedSimple('Skipped %s entry: %s' % (entry.entryType(), entry.reason()), entry, 'No children:', children))
         else:
-            assert False, [type(entry), start, entry]
+            raise ParseError(repr([type(entry), start, entry]))
+
+    # Same as parse, but entries that do not have the expected structure are
+    # organized with their children only, and counted in 'skipped'.
+    @staticmethod
+    def parseTolerant(entries, start, skipped):
+        try:
+            return Organized.parse(entries, start)
+        except ParseError:
+            (entry, children) = entries[start]
+            countSkipped(skipped, type(entry).__name__, 'could not organize')
+            return (start + 1, OrganizedSimple('Could not organize %s' % type(entry).__name__, entry, 'Children:', children))
+
+    # The organized entries computed by this one, e.g. those computed while
+    # attempting an equation, but not the entry that says whether it applies.
+    def children(self):
+        assert False, type(self)
+
+    # Yields the text of this entry as strings, and (child, context_start,
+    # indent) triples where the text of a child goes. See organizedText.
+    def parts(self, context_start, indent):
+        assert False, type(self)
+
+    # The fields of the entry's JSON Lines record, besides those that all
+    # records have.
+    def record(self):
+        assert False, type(self)
+
+    def write(self, context_start, indent, out):
+        out.extend(organizedText(self, context_start, indent))
 
-    def _indent(self, indent, out):
-        for _ in range(0, indent):
-            out.append(INDENT)
+    def _line(self, indent, text):
+        return '%s%s\n' % (INDENT * indent, text)
 
-    def _writeKore(self, kore, indent, out):
+    def _contextParts(self, context, context_start, indent):
+        for c in context.suffix(context_start):
+            yield self._line(indent, c)
+
+    def _koreParts(self, kore, indent):
+        prefix = INDENT * indent
         for line in kore:
-            self._indent(indent, out)
-            out.append(line)
-            out.append('\n')
+            yield '%s%s\n' % (prefix, line)
+
+    def _equationParts(self, context_start, indent):
+        attempt = self.main_entry()
+        yield self._line(indent, 'Context:')
+        yield from self._contextParts(attempt.context(), context_start, indent + 1)
+        yield self._line(indent + 1, 'Current equation: %s' % attempt.equationLocation())
+        yield self._line(indent, 'Term:')
+        yield from self._koreParts(attempt.termKore(), indent + 1)
+
+    def _equationRecord(self):
+        attempt = self.main_entry()
+        return {
+            'equation': str(attempt.equationLocation()),
+            'term': '\n'.join(attempt.termKore()),
+        }
 
 class OrganizedSimple(Organized):
     def __init__(self, description, entry, children_description, children):
@@ -637,30 +1168,25 @@ class OrganizedSimple(Organized):
     def main_entry(self):
         return self.__entry
 
-    def write(self, context_start, indent, out):
-        self._indent(indent, out)
-        out.append(self.__description)
-        out.append('\n')
+    def children(self):
+        return self.__children
+
+    def parts(self, context_start, indent):
+        yield self._line(indent, self.__description)
         indent += 1
 
-        self._indent(indent, out)
-        out.append("Context:\n")
+        yield self._line(indent, 'Context:')
         context = self.__entry.context()
-        for i in range(context_start, len(context)):
-            self._indent(indent + 1, out)
-            context[i].write(out)
-            out.append('\n')
-
-        self._indent(indent, out)
-        out.append(self.__children_description)
-        out.append('\n')
+        if context is not None:
+            yield from self._contextParts(context, context_start, indent + 1)
+            context_start = len(context) + 1
 
+        yield self._line(indent, self.__children_description)
         for c in self.__children:
-            c.write(len(context) + 1, indent + 1, out)
+            yield (c, context_start, indent + 1)
 
-    def writeChildren(self, context_start, indent, out):
-        for c in self.__children:
-            c.write(context_start, indent, out)
+    def record(self):
+        return {'description': self.__description}
 
     def __str__(self):
         return repr(self)
@@ -679,36 +1205,29 @@ class OrganizedAppliedEquation(Organized):
     def main_entry(self):
         return self.__debug_attempt_equation
 
-    def write(self, context_start, indent, out):
-        self._indent(indent, out)
-        out.append("Applying equation:\n")
-        indent += 1
+    def children(self):
+        return self.__children
 
-        self._indent(indent, out)
-        out.append("Context:\n")
-        context = self.__debug_attempt_equation.context()
-        for i in range(context_start, len(context)):
-            self._indent(indent + 1, out)
-            context[i].write(out)
-            out.append('\n')
-
-        self._indent(indent + 1, out)
-        out.append('Current equation: ')
-        out.append(str(self.__debug_attempt_equation.equationLocation()))
-        out.append('\n')
+    def result(self):
+        return self.__result
 
-        self._indent(indent, out)
-        out.append("Term:\n")
-        self._writeKore(self.__debug_attempt_equation.termKore(), indent + 1, out)
+    def parts(self, context_start, indent):
+        yield self._line(indent, 'Applying equation:')
+        indent += 1
+        yield from self._equationParts(context_start, indent)
 
-        self._indent(indent, out)
-        out.append("Result:\n")
-        self._writeKore(self.__result.kore(), indent + 1, out)
+        yield self._line(indent, 'Result:')
+        yield from self._koreParts(self.__result.kore(), indent + 1)
 
-        self._indent(indent, out)
-        out.append("Computation:\n")
+        yield self._line(indent, 'Computation:')
+        context_start = len(self.__debug_attempt_equation.context()) + 1
         for c in self.__children:
-            c.write(len(context) + 1, indent + 1, out)
+            yield (c, context_start, indent + 1)
+
+    def record(self):
+        record = self._equationRecord()
+        record['result'] = '\n'.join(self.__result.kore())
+        return record
 
 class OrganizedNotAppliedEquationRequirement(Organized):
     def __init__(self, debug_attempt_equation, children, debug_not_apply_equation):
@@ -719,58 +1238,49 @@ class OrganizedNotAppliedEquationRequirement(Organized):
     def main_entry(self):
         return self.__debug_attempt_equation
 
-    def write(self, context_start, indent, out):
-        self._indent(indent, out)
-        out.append("Not applying equation:\n")
-        indent += 1
+    def children(self):
+        return self.__children
 
-        self._indent(indent, out)
-        out.append("Context:\n")
-        context = self.__debug_attempt_equation.context()
-        for i in range(context_start, len(context)):
-            self._indent(indent + 1, out)
-            context[i].write(out)
-            out.append('\n')
-
-        self._indent(indent + 1, out)
-        out.append('Current equation: ')
-        out.append(str(self.__debug_attempt_equation.equationLocation()))
-        out.append('\n')
+    def requirement(self):
+        return self.__debug_not_apply_equation
 
-        self._indent(indent, out)
-        out.append("Term:\n")
-        self._writeKore(self.__debug_attempt_equation.termKore(), indent + 1, out)
+    def parts(self, context_start, indent):
+        requirement = self.__debug_not_apply_equation
+        yield self._line(indent, 'Not applying equation:')
+        indent += 1
+        yield from self._equationParts(context_start, indent)
 
-        self._indent(indent, out)
-        out.append('Requirement:\n')
-        self._writeKore(self.__debug_not_apply_equation.requiresKore(), indent + 1, out)
+        yield self._line(indent, 'Requirement:')
+        yield from self._koreParts(requirement.requiresKore(), indent + 1)
 
-        self._indent(indent, out)
-        out.append('Matching condition:\n')
-        self._writeKore(self.__debug_not_apply_equation.matchingKore(), indent + 1, out)
+        yield self._line(indent, 'Matching condition:')
+        yield from self._koreParts(requirement.matchingKore(), indent + 1)
 
-        self._indent(indent, out)
-        out.append('Side condition:\n')
-        self._indent(indent + 1, out)
-        out.append('Assumed true:\n')
-        self._writeKore(self.__debug_not_apply_equation.sideConditionKore(), indent + 2, out)
+        yield self._line(indent, 'Side condition:')
+        yield self._line(indent + 1, 'Assumed true:')
+        yield from self._koreParts(requirement.sideConditionKore(), indent + 2)
 
-        self._indent(indent + 1, out)
-        out.append('Term replacements:\n')
-        self._writeKore(self.__debug_not_apply_equation.termReplacementsKore(), indent + 2, out)
+        yield self._line(indent + 1, 'Term replacements:')
+        yield from self._koreParts(requirement.termReplacementsKore(), indent + 2)
 
-        self._indent(indent + 1, out)
-        out.append('Predicate replacements:\n')
-        self._writeKore(self.__debug_not_apply_equation.predicateReplacementsKore(), indent + 2, out)
+        yield self._line(indent + 1, 'Predicate replacements:')
+        yield from self._koreParts(requirement.predicateReplacementsKore(), indent + 2)
 
-        self._indent(indent + 1, out)
-        out.append('Assumed to be defined:\n')
-        self._writeKore(self.__debug_not_apply_equation.definedTermsKore(), indent + 2, out)
+        yield self._line(indent + 1, 'Assumed to be defined:')
+        yield from self._koreParts(requirement.definedTermsKore(), indent + 2)
 
-        self._indent(indent, out)
-        out.append("Computation:\n")
+        yield self._line(indent, 'Computation:')
+        context_start = len(self.__debug_attempt_equation.context()) + 1
         for c in self.__children:
-            c.write(len(context) + 1, indent + 1, out)
+            yield (c, context_start, indent + 1)
+
+    def record(self):
+        requirement = self.__debug_not_apply_equation
+        record = self._equationRecord()
+        record['requirement'] = '\n'.join(requirement.requiresKore())
+        record['matching'] = '\n'.join(requirement.matchingKore())
+        record['negated_implication'] = '\n'.join(requirement.negatedImplicationKore())
+        return record
 
 class OrganizedNotAppliedEquationMatch(Organized):
     def __init__(self, debug_attempt_equation, debug_not_apply_equation):
@@ -780,31 +1290,21 @@ class OrganizedNotAppliedEquationMatch(Organized):
     def main_entry(self):
         return self.__debug_attempt_equation
 
-    def write(self, context_start, indent, out):
-        self._indent(indent, out)
-        out.append("Not applying equation, matching failed:\n")
-        indent += 1
+    def children(self):
+        return self.__debug_not_apply_equation.children()
 
-        self._indent(indent, out)
-        out.append("Context:\n")
-        context = self.__debug_attempt_equation.context()
-        for i in range(context_start, len(context)):
-            self._indent(indent + 1, out)
-            context[i].write(out)
-            out.append('\n')
-
-        self._indent(indent + 1, out)
-        out.append('Current equation: ')
-        out.append(str(self.__debug_attempt_equation.equationLocation()))
-        out.append('\n')
+    def parts(self, context_start, indent):
+        yield self._line(indent, 'Not applying equation, matching failed:')
+        indent += 1
+        yield from self._equationParts(context_start, indent)
 
-        self._indent(indent, out)
-        out.append("Term:\n")
-        self._writeKore(self.__debug_attempt_equation.termKore(), indent + 1, out)
+        yield self._line(indent, 'Matching computation:')
+        context_start = len(self.__debug_attempt_equation.context()) + 1
+        for c in self.children():
+            yield (c, context_start, indent + 1)
 
-        self._indent(indent, out)
-        out.append("Matching computation:\n")
-        self.__debug_not_apply_equation.writeChildren(len(context) + 1, indent + 1, out)
+    def record(self):
+        return self._equationRecord()
 
 class OrganizedNotAppliedEquationApplyMatch(Organized):
     def __init__(self, debug_attempt_equation, children, debug_not_apply_equation):
@@ -815,106 +1315,1297 @@ class OrganizedNotAppliedEquationApplyMatch(Organized):
     def main_entry(self):
         return self.__debug_attempt_equation
 
-    def write(self, context_start, indent, out):
-        self._indent(indent, out)
-        out.append("Not applying equation, matching failed:\n")
-        indent += 1
+    def children(self):
+        return self.__children
 
-        self._indent(indent, out)
-        out.append("Context:\n")
-        context = self.__debug_attempt_equation.context()
-        for i in range(context_start, len(context)):
-            self._indent(indent + 1, out)
-            context[i].write(out)
-            out.append('\n')
-
-        self._indent(indent + 1, out)
-        out.append('Current equation: ')
-        out.append(str(self.__debug_attempt_equation.equationLocation()))
-        out.append('\n')
-
-        self._indent(indent, out)
-        out.append("Term:\n")
-        self._writeKore(self.__debug_attempt_equation.termKore(), indent + 1, out)
+    def parts(self, context_start, indent):
+        yield self._line(indent, 'Not applying equation, matching failed:')
+        indent += 1
+        yield from self._equationParts(context_start, indent)
 
-        self._indent(indent, out)
-        out.append("Computation:\n")
+        yield self._line(indent, 'Computation:')
+        context_start = len(self.__debug_attempt_equation.context()) + 1
         for c in self.__children:
-            c.write(len(context) + 1, indent + 1, out)
+            yield (c, context_start, indent + 1)
 
-        self._indent(indent, out)
-        out.append("Matching failure reasons:\n")
+        yield self._line(indent, 'Matching failure reasons:')
         for reason in self.__debug_not_apply_equation.reasons():
-            self._indent(indent + 1, out)
-            out.append(reason)
-            out.append('\n')
-
-def parse(contents):
-    lines = contents.split('\n')
-    entries = []
+            yield self._line(indent + 1, reason)
+
+    def record(self):
+        record = self._equationRecord()
+        record['reasons'] = list(self.__debug_not_apply_equation.reasons())
+        return record
+
+# Yields the text of an organized entry and of the entries nested in it.
+# The nested entries are visited with a stack of part generators instead of
+# recursion, so deep traces do not run out of stack.
+def organizedText(organized, context_start=0, indent=0):
+    stack = [organized.parts(context_start, indent)]
+    while stack:
+        part = next(stack[-1], None)
+        if part is None:
+            stack.pop()
+        elif isinstance(part, str):
+            yield part
+        else:
+            (child, child_context_start, child_indent) = part
+            stack.append(child.parts(child_context_start, child_indent))
+
+# Yields one JSON Lines record for an organized entry and for each entry
+# nested in it, parents first. 'ids' numbers the records of the whole log.
+def organizedRecords(organized, ids):
+    # (organized, parent id, depth)
+    stack = [(organized, None, 0)]
+    while stack:
+        (current, parent, depth) = stack.pop()
+        entry = current.main_entry()
+        context = entry.context()
+        record = {
+            'id': next(ids),
+            'parent': parent,
+            'depth': depth,
+            'type': type(current).__name__,
+            'entry': type(entry).__name__,
+            'context': [] if context is None else [str(c) for c in context],
+        }
+        record.update(current.record())
+        yield json.dumps(record) + '\n'
+        for child in reversed(current.children()):
+            stack.append((child, record['id'], depth + 1))
+
+def isEntryHeader(line):
+    return not line.startswith(INDENT) and not line.startswith(CONTEXT)
+
+# Yields the lines of each entry.
+def entryLines(lines):
     current_lines = []
     for line in lines:
         if not line:
             continue
-        if not line.startswith(INDENT) and not line.startswith(CONTEXT):
+        if isEntryHeader(line):
             if current_lines:
-                # print(current_lines)
-                entry = LogEntry.parse(current_lines)
-                assert entry is not None, current_lines
-                entries.append(entry)
+                yield current_lines
                 current_lines = []
         current_lines.append(line)
     if current_lines:
+        yield current_lines
+
+# The type in an entry header like 'kore-rpc: [1] Debug (LogMessage):'.
+def headerType(line):
+    header = line.strip()
+    if not header.endswith('):') or '(' not in header:
+        return None
+    return header[header.rfind('(') + 1:-2]
+
+# The number in an entry header like 'kore-rpc: [1] Debug (LogMessage):', or
+# None if there is none.
+HEADER_TIMESTAMP = re.compile(r'\[(\d+(?:\.\d+)?)\]')
+
+def headerTimestamp(line):
+    m = HEADER_TIMESTAMP.search(line)
+    if not m:
+        return None
+    return float(m.group(1))
+
+# The lines below 'Context:' in an entry, as LogEntry.parse would see them,
+# without parsing the rest of the entry. None for entries without a context.
+def entryContextLines(lines):
+    if headerType(lines[0]) != 'DebugAttemptEquation':
+        return None
+    removed = 0
+    if lines[0].startswith('  kore-'):
+        removed = 2
+    for i in range(1, len(lines)):
+        line = lines[i][removed:]
+        if line.startswith(INDENT):
+            line = line[len(INDENT):]
+        if line.startswith(CONTEXT):
+            context_lines = []
+            for line in lines[i + 1:]:
+                line = line[removed:]
+                if line.startswith(INDENT):
+                    line = line[len(INDENT):]
+                context_lines.append(line)
+            return context_lines
+    return None
+
+def entryContext(lines, tolerant=False):
+    context_lines = entryContextLines(lines)
+    if context_lines is None:
+        return None
+    try:
+        return ContextNode.fromLines(context_lines)
+    except ParseError:
+        if not tolerant:
+            raise
+        # The entry will not be parsed either.
+        return None
+
+# The name of the LogEntry class that LogEntry.parse would create for the
+# entry, or None if the header does not tell.
+def entryClassName(lines):
+    header_type = headerType(lines[0])
+    if header_type != 'DebugAttemptEquation':
+        return header_type
+    body = [line.strip() for line in lines[1:3]]
+    if not body:
+        return None
+    if body[0].startswith(DebugAttemptEquation.APPLY_PREFIX):
+        return DebugAttemptEquation.__name__
+    if body[0].startswith(EquationIsApplicable.PREFIX):
+        return EquationIsApplicable.__name__
+    if body[0].startswith(EquationIsNotApplicable.PREFIX) and len(body) > 1:
+        if body[1].startswith(EquationIsNotApplicableRequirement.EQUATION_REQUIREMENT_PREFIX):
+            return EquationIsNotApplicableRequirement.__name__
+        if body[1].startswith(EquationIsNotApplicableMatch.EQUATION_MATCH_PREFIX):
+            return EquationIsNotApplicableMatch.__name__
+        if body[1].startswith(EquationIsNotApplicableApplyMatch.EQUATION_MATCH_PREFIX):
+            return EquationIsNotApplicableApplyMatch.__name__
+    return None
+
+# The type names an entry matches, i.e. its header type and the name of the
+# LogEntry class that LogEntry.parse would create for it.
+def entryTypes(lines):
+    types = set()
+    header_type = headerType(lines[0])
+    if header_type is None:
+        return types
+    types.add(header_type)
+    class_name = entryClassName(lines)
+    if class_name is not None:
+        types.add(class_name)
+    return types
+
+# The class names entryClassName returns for DebugAttemptEquation entries.
+CLASS_NAMES = {
+    DebugAttemptEquation.__name__,
+    EquationIsApplicable.__name__,
+    EquationIsNotApplicableRequirement.__name__,
+    EquationIsNotApplicableMatch.__name__,
+    EquationIsNotApplicableApplyMatch.__name__,
+}
+
+NOT_APPLICABLE_CLASS_NAMES = {
+    EquationIsNotApplicableRequirement.__name__,
+    EquationIsNotApplicableMatch.__name__,
+    EquationIsNotApplicableApplyMatch.__name__,
+}
+
+def endsContext(open_context, context):
+    return len(context) <= len(open_context) or context.isTopLevel()
+
+# Groups the entries, given as their lines, by top-level entry: each group
+# has a top-level entry and the entries that organize() nests in it. It
+# follows TreeBuilder.add, with the (context, class name) pairs of the open
+# entries instead of the entries, so that entries without a context start
+# their own group when TreeBuilder puts them at the top level. An applied
+# equation stays in the group of its attempt, Organized.parse pairs them.
+# Entries that fail to parse only past their header may be grouped
+# differently.
+def topLevelEntryGroups(entry_lines, tolerant=False):
+    group = []
+    stack = []
+    for lines in entry_lines:
+        class_name = entryClassName(lines)
+        if tolerant and class_name not in LogEntry.entries() and class_name not in CLASS_NAMES:
+            # Parsed as a GenericLogEntry, which has no context.
+            context = None
+        else:
+            context = entryContext(lines, tolerant)
+        if context is None:
+            if (    class_name == DebugApplyEquation.__name__
+                and len(stack) > 1
+                and stack[-1][1] == EquationIsApplicable.__name__
+                ):
+                del stack[-2:]
+            else:
+                while (     len(stack) > 1
+                        and stack[-1][1] in NOT_APPLICABLE_CLASS_NAMES
+                        and stack[-2][1] == DebugAttemptEquation.__name__
+                        ):
+                    del stack[-2:]
+        else:
+            while stack and endsContext(stack[-1][0], context):
+                stack.pop()
+            # Tolerant organizing also closes the entries that are not
+            # prefixes, strict organizing fails on them after parsing.
+            while stack and not stack[-1][0].isStrictPrefixOf(context):
+                stack.pop()
+        if group and not stack and class_name != DebugApplyEquation.__name__:
+            yield group
+            group = []
+        group.append(lines)
+        if context is not None:
+            stack.append((context, class_name))
+    if group:
+        yield group
+
+# Selects the top-level entries that have, somewhere inside them, an attempt
+# of an equation, an entry of a type and a context line containing some text.
+# It only looks at entry headers, contexts and equation locations, the other
+# entries are dropped before being parsed. Top-level entries without a
+# context, like the JSON-RPC ones, match only on their own type.
+class EntryFilter(object):
+    def __init__(self, equation=None, entry_type=None, context=None):
+        self.__equation = None
+        if equation is not None:
+            # The file name may be given relative to any of its parents.
+            self.__equation = re.compile(
+                r'equation at (?:\S*/)?' + re.escape(equation) + r'(?![\w:])')
+        self.__entry_type = entry_type
+        self.__context = context
+
+    def isEmpty(self):
+        return self.__equation is None and self.__entry_type is None and self.__context is None
+
+    def select(self, entry_lines, tolerant=False):
+        for group in topLevelEntryGroups(entry_lines, tolerant):
+            if self.matches(group):
+                yield from group
+
+    def matches(self, group):
+        found_equation = self.__equation is None
+        found_entry_type = self.__entry_type is None
+        found_context = self.__context is None
+        for lines in group:
+            context_lines = entryContextLines(lines) or []
+            if not found_equation:
+                for line in lines[1:2] + context_lines:
+                    if self.__equation.search(line):
+                        found_equation = True
+                        break
+            if not found_entry_type:
+                found_entry_type = self.__entry_type in entryTypes(lines)
+            if not found_context:
+                for line in context_lines:
+                    if self.__context in line:
+                        found_context = True
+                        break
+            if found_equation and found_entry_type and found_context:
+                return True
+        return False
+
+# Parses the entries, given as their lines, e.g. from entryLines or
+# LogSource.entryLines.
+def parseEntries(entry_lines, tolerant=False, entry_filter=None):
+    if entry_filter is not None:
+        entry_lines = entry_filter.select(entry_lines, tolerant)
+    for current_lines in entry_lines:
+        # print(current_lines)
+        if tolerant:
+            yield LogEntry.parseTolerant(current_lines)
+            continue
         entry = LogEntry.parse(current_lines)
-        assert entry is not None, current_lines
-        entries.append(entry)
-    return entries
+        expect(entry is not None, current_lines)
+        yield entry
 
-def lenNull(ctx):
-    if ctx is None:
-        return 1000
-    return len(ctx)
+def parse(contents):
+    return list(parseEntries(entryLines(contents.split('\n'))))
+
+def parseChunk(path, start, end, tolerant, entry_filter):
+    return list(parseEntries(LogSource.forPath(path).entryLines(start, end), tolerant, entry_filter))
+
+# Parses the chunks of the source in a process pool. The entries are
+# returned in the same order as parseEntries(source.entryLines()) would.
+def parseEntriesInParallel(source, pool, jobs, tolerant=False, entry_filter=None):
+    chunks = source.chunks(jobs * CHUNKS_PER_JOB)
+    parsed = pool.map(
+        parseChunk,
+        [source.path()] * len(chunks),
+        [start for (start, _) in chunks],
+        [end for (_, end) in chunks],
+        [tolerant] * len(chunks),
+        [entry_filter] * len(chunks))
+    return itertools.chain.from_iterable(parsed)
+
+def countSkipped(skipped, entry_type, reason):
+    key = (entry_type, reason)
+    skipped[key] = skipped.get(key, 0) + 1
+
+def endsEntry(entry, context):
+    return endsContext(entry.context(), context)
+
+# Rebuilds the entry nesting from the contexts in a single pass over the log.
+# An entry is a child of the closest open entry whose context is a strict
+# prefix of its own. Entries without a context are leaves.
+#
+# If 'skipped' is a dictionary, the builder is tolerant: it counts in it the
+# entries that do not fit in the nesting and organizes them as well as it
+# can instead of failing.
+class TreeBuilder(object):
+    def __init__(self, skipped=None):
+        # (entry, children) pairs for the entries whose children are still
+        # being read, the first one holds the top-level entries.
+        self.__stack = [(None, [])]
+        self.__skipped = skipped
+
+    # Returns the nesting level of the entry's parent, 0 for top-level
+    # entries.
+    def add(self, entry):
+        context = entry.context()
+        if context is None:
+            if (    isinstance(entry, DebugApplyEquation)
+                and len(self.__stack) > 2
+                and isinstance(self.__stack[-1][0], EquationIsApplicable)
+                ):
+                # The applied equation closes its attempt, it goes right
+                # after it so that Organized.parse can pair them.
+                self.__pop()
+                self.__pop()
+            else:
+                # An attempt ends with the reason it does not apply, entries
+                # without a context that follow it, like the JSON-RPC ones,
+                # go after the attempt instead of inside that reason.
+                while (     len(self.__stack) > 2
+                        and isinstance(self.__stack[-1][0], EquationIsNotApplicable)
+                        and isinstance(self.__stack[-2][0], DebugAttemptEquation)
+                        ):
+                    self.__pop()
+                    self.__pop()
+            self.__stack[-1][1].append((entry, []))
+            return len(self.__stack) - 1
+        while len(self.__stack) > 1 and endsEntry(self.__stack[-1][0], context):
+            self.__pop()
+        if self.__skipped is not None:
+            if len(self.__stack) > 1 and not self.__stack[-1][0].context().isStrictPrefixOf(context):
+                countSkipped(self.__skipped, type(entry).__name__, 'unexpected context')
+                while len(self.__stack) > 1 and not self.__stack[-1][0].context().isStrictPrefixOf(context):
+                    self.__pop()
+        elif len(self.__stack) > 1:
+            checkContextPrefix(self.__stack[-1][0], entry)
+        self.__stack.append((entry, []))
+        return len(self.__stack) - 2
+
+    def finish(self):
+        while len(self.__stack) > 1:
+            self.__pop()
+
+    # Yields the organized top-level entries, leaving out the last 'keep'
+    # complete ones.
+    def takeOrganized(self, keep):
+        top = self.__stack[0][1]
+        start = 0
+        while len(top) - start > keep:
+            (start, result) = self.__organize(top, start)
+            yield result
+        del top[:start]
+
+    def __pop(self):
+        (entry, children) = self.__stack.pop()
+        start = 0
+        organized = []
+        while start < len(children):
+            (start, result) = self.__organize(children, start)
+            organized.append(result)
+        self.__stack[-1][1].append((entry, organized))
+
+    def __organize(self, preparsed, start):
+        if self.__skipped is None:
+            return Organized.parse(preparsed, start)
+        return Organized.parseTolerant(preparsed, start, self.__skipped)
+
+# Yields each top-level organized entry as soon as the log moves past it, so
+# only one of them is kept in memory.
+#
+# If 'skipped' is a dictionary, unparsed entries and entries that could not
+# be organized are counted in it instead of failing, by (type, reason).
+def organize(entries, skipped=None):
+    builder = TreeBuilder(skipped)
+    for entry in entries:
+        if skipped is not None and isinstance(entry, GenericLogEntry):
+            countSkipped(skipped, entry.entryType(), entry.reason())
+        builder.add(entry)
+        # Organized.parse looks at most one entry ahead.
+        yield from builder.takeOrganized(1)
+    builder.finish()
+    yield from builder.takeOrganized(0)
 
 def parseFunctionApplication(entries):
-    start = 0
-    preparsed = []
-    while start < len(entries):
-        entry = entries[start]
-        start += 1
-        if entry.context() is None:
-            preparsed.append((entry, []))
-            continue
-        (start, children) = extract_inner_entries(entries, start, lenNull(entry.context()))
-        checkContextPrefixList(entry, children)
-        parsed_children = parseFunctionApplication(children)
+    return list(organize(entries))
 
-        preparsed.append((entry, parsed_children))
+class EquationProfile(object):
+    APPLIED = 'applied'
+    MATCH = 'match'
+    REQUIREMENT = 'requirement'
+    APPLY_MATCH = 'apply match'
 
-    start = 0
-    results = []
-    while start < len(preparsed):
-        (start, result) = Organized.parse(preparsed, start)
-        results.append(result)
-    return results
+    OUTCOMES = {
+        'OrganizedAppliedEquation': APPLIED,
+        'OrganizedNotAppliedEquationMatch': MATCH,
+        'OrganizedNotAppliedEquationRequirement': REQUIREMENT,
+        'OrganizedNotAppliedEquationApplyMatch': APPLY_MATCH,
+    }
+
+    def __init__(self, location):
+        self.__location = location
+        self.__attempts = 0
+        self.__outcomes = {outcome: 0 for outcome in EquationProfile.OUTCOMES.values()}
+        self.__inclusive = 0
+        self.__exclusive = 0
+
+    def location(self):
+        return self.__location
+
+    def attempts(self):
+        return self.__attempts
+
+    def outcome(self, outcome):
+        return self.__outcomes[outcome]
+
+    def inclusive(self):
+        return self.__inclusive
+
+    def exclusive(self):
+        return self.__exclusive
+
+    def add(self, organized, inclusive, exclusive):
+        self.__attempts += 1
+        self.__outcomes[EquationProfile.OUTCOMES[type(organized).__name__]] += 1
+        self.__inclusive += inclusive
+        self.__exclusive += exclusive
+
+# Aggregates the equation attempts per equation location. The cost of an
+# attempt is the number of organized entries nested in it: inclusive counts
+# all of them, exclusive leaves out those inside nested equation attempts.
+# When an equation is attempted while it is already being attempted, only
+# the outermost attempt counts towards its inclusive cost.
+class ProfileReport(object):
+    def __init__(self, args):
+        self.__equations = {}
+        self.__rule_index = None
+        if args.rule_index is not None:
+            self.__rule_index = ruleindex.RuleIndex(args.rule_index)
+
+    def add(self, organized):
+        # [organized, children left to visit, nested entries, nested entries
+        # inside equation attempts]
+        stack = [[organized, list(reversed(organized.children())), 0, 0]]
+        # Number of attempts of each equation on the stack.
+        active = {}
+        self.__enter(organized, active)
+        while stack:
+            frame = stack[-1]
+            if frame[1]:
+                child = frame[1].pop()
+                self.__enter(child, active)
+                stack.append([child, list(reversed(child.children())), 0, 0])
+                continue
+            stack.pop()
+            (current, _, nested, in_attempts) = frame
+            location = self.__location(current)
+            if location is not None:
+                active[location] -= 1
+                inclusive = nested if active[location] == 0 else 0
+                self.__profile(location).add(current, inclusive, nested - in_attempts)
+            if stack:
+                parent = stack[-1]
+                parent[2] += nested + 1
+                if location is None:
+                    parent[3] += in_attempts
+                else:
+                    parent[3] += nested + 1
+
+    def profiles(self):
+        return sorted(
+            self.__equations.values(),
+            key=lambda p: (-p.inclusive(), -p.exclusive(), -p.attempts(), p.location()))
+
+    def write(self, f):
+        f.write(
+            '%8s %8s %8s %8s %8s %8s %10s %10s  %s\n'
+            % ( 'attempts', 'applied', 'success', 'match', 'require', 'apply', 'inclusive', 'exclusive'
+              , 'equation'
+              ))
+        for p in self.profiles():
+            f.write(
+                '%8d %8d %7.1f%% %8d %8d %8d %10d %10d  %s\n'
+                % ( p.attempts()
+                  , p.outcome(EquationProfile.APPLIED)
+                  , 100.0 * p.outcome(EquationProfile.APPLIED) / p.attempts()
+                  , p.outcome(EquationProfile.MATCH)
+                  , p.outcome(EquationProfile.REQUIREMENT)
+                  , p.outcome(EquationProfile.APPLY_MATCH)
+                  , p.inclusive()
+                  , p.exclusive()
+                  , self.__describe(p.location())
+                  ))
+
+    # The location, followed by the rule label when the rule index has one.
+    def __describe(self, location):
+        if self.__rule_index is None:
+            return location
+        l = FileLocation.parse(location)
+        rule = self.__rule_index.rule(l.fileName(), l.startLine(), l.startColumn())
+        if rule is None or rule.label is None:
+            return location
+        return '%s [%s]' % (location, rule.label)
+
+    def __enter(self, organized, active):
+        location = self.__location(organized)
+        if location is not None:
+            active[location] = active.get(location, 0) + 1
+
+    def __location(self, organized):
+        if type(organized).__name__ not in EquationProfile.OUTCOMES:
+            return None
+        return str(organized.main_entry().equationLocation())
+
+    def __profile(self, location):
+        profile = self.__equations.get(location)
+        if profile is None:
+            profile = EquationProfile(location)
+            self.__equations[location] = profile
+        return profile
+
+# Folded stacks for flame graph tools: one line per path of nested organized
+# entries, with the weight of the entries at the end of that path. Equation
+# attempts are named by their location, other entries by their type, and
+# paths start with the context of the top-level entry.
+class FoldedReport(object):
+    def __init__(self, args):
+        self.__weight = FoldedReport.WEIGHTS[args.weight]
+        self.__weights = {}
+
+    def add(self, organized):
+        context = organized.main_entry().context()
+        if context is None:
+            prefix = ''
+        else:
+            prefix = ''.join([foldedFrame(str(c)) + ';' for c in context])
+        stack = [(prefix, organized)]
+        while stack:
+            (path, current) = stack.pop()
+            path = path + foldedFrame(organizedName(current))
+            weight = self.__weight(current)
+            if weight:
+                self.__weights[path] = self.__weights.get(path, 0) + weight
+            for child in current.children():
+                stack.append((path + ';', child))
+
+    def write(self, f):
+        for path in sorted(self.__weights.keys()):
+            f.write('%s %d\n' % (path, self.__weights[path]))
+
+    @staticmethod
+    def termSize(organized):
+        entry = organized.main_entry()
+        if not isinstance(entry, DebugAttemptEquation):
+            return 0
+        return kore.nodeCount(termText(entry.termKore()))
+
+    WEIGHTS = {
+        'entries': lambda organized: 1,
+        'term-size': lambda organized: FoldedReport.termSize(organized),
+    }
+
+class GrowthProfile(object):
+    def __init__(self, location):
+        self.location = location
+        self.applications = 0
+        self.term_nodes = 0
+        self.result_nodes = 0
+        self.max_growth = None
+
+    def add(self, term_nodes, result_nodes):
+        self.applications += 1
+        self.term_nodes += term_nodes
+        self.result_nodes += result_nodes
+        growth = result_nodes - term_nodes
+        if self.max_growth is None or growth > self.max_growth:
+            self.max_growth = growth
+
+    def growth(self):
+        return self.result_nodes - self.term_nodes
+
+# Term sizes, in kore nodes, before and after each equation application.
+# Equations are ranked by how much they grow terms in total. A chain is a
+# sequence of applications where each one is applied to the exact result of
+# the previous one and makes the term larger; the chains that grow terms the
+# most are listed after the equations.
+class GrowthReport(object):
+    # Results that the next applications may continue, oldest dropped first.
+    OPEN_CHAINS = 10000
+    CHAINS = 20
+
+    def __init__(self, args):
+        self.__equations = {}
+        # term text -> [(location, term nodes, result nodes)] ending with it
+        self.__open = collections.OrderedDict()
+        # (growth, order, chain) for the chains that grew most.
+        self.__chains = []
+        self.__count = 0
+
+    def add(self, organized):
+        stack = [organized]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, OrganizedAppliedEquation):
+                self.__addApplication(current)
+            stack.extend(reversed(current.children()))
+
+    def write(self, f):
+        f.write(
+            '%8s %10s %10s %10s %10s  %s\n'
+            % ('applied', 'term', 'result', 'growth', 'max', 'equation'))
+        equations = sorted(
+            self.__equations.values(),
+            key=lambda p: (-p.growth(), -p.max_growth, p.location))
+        for p in equations:
+            f.write(
+                '%8d %10.1f %10.1f %+10d %+10d  %s\n'
+                % ( p.applications
+                  , float(p.term_nodes) / p.applications
+                  , float(p.result_nodes) / p.applications
+                  , p.growth()
+                  , p.max_growth
+                  , p.location
+                  ))
+        chains = self.__chains + [self.__chainItem(chain) for chain in self.__open.values() if len(chain) > 1]
+        chains = sorted(chains, reverse=True)[:GrowthReport.CHAINS]
+        if chains:
+            f.write('\nGrowing chains:\n')
+        for (growth, _, chain) in chains:
+            f.write('%+d nodes in %d applications:\n' % (growth, len(chain)))
+            for (location, term_nodes, result_nodes) in chain:
+                f.write('%s%d -> %d  %s\n' % (INDENT, term_nodes, result_nodes, location))
+
+    def __addApplication(self, organized):
+        location = str(organized.main_entry().equationLocation())
+        term = termText(organized.main_entry().termKore())
+        result = termText(organized.result().kore())
+        term_nodes = kore.nodeCount(term)
+        result_nodes = kore.nodeCount(result)
+        profile = self.__equations.get(location)
+        if profile is None:
+            profile = GrowthProfile(location)
+            self.__equations[location] = profile
+        profile.add(term_nodes, result_nodes)
+
+        chain = self.__open.pop(term, None)
+        if chain is not None and result_nodes <= term_nodes:
+            self.__endChain(chain)
+            chain = None
+        if result_nodes <= term_nodes:
+            return
+        if chain is None:
+            chain = []
+        chain.append((location, term_nodes, result_nodes))
+        self.__open[result] = chain
+        if len(self.__open) > GrowthReport.OPEN_CHAINS:
+            (_, oldest) = self.__open.popitem(last=False)
+            self.__endChain(oldest)
+
+    def __chainItem(self, chain):
+        self.__count += 1
+        return (chain[-1][2] - chain[0][1], -self.__count, chain)
+
+    def __endChain(self, chain):
+        if len(chain) < 2:
+            return
+        item = self.__chainItem(chain)
+        if len(self.__chains) < GrowthReport.CHAINS:
+            heapq.heappush(self.__chains, item)
+        else:
+            heapq.heappushpop(self.__chains, item)
+
+# The text of a kore term without its line breaks and indentation.
+def termText(lines):
+    return ' '.join([line.strip() for line in lines])
+
+class RequirementCluster(object):
+    def __init__(self, implication, nodes):
+        self.implication = implication
+        self.nodes = nodes
+        self.failures = 0
+        self.cost = 0
+        self.equations = {}
+
+    def add(self, location, cost):
+        self.failures += 1
+        self.cost += cost
+        self.equations[location] = self.equations.get(location, 0) + 1
+
+# Clusters the requirement failures whose negated implications are the same
+# up to variable names. Each of them is a solver call, so the clusters with
+# the most failures and the most nested entries are those that a missing
+# lemma would save the most time on. The nested cost of a failure is the
+# number of organized entries inside its attempt.
+class RequirementReport(object):
+    def __init__(self, args):
+        self.__top = args.top
+        self.__clusters = {}
+
+    def add(self, organized):
+        # [organized, children left to visit, nested entries]
+        stack = [[organized, list(reversed(organized.children())), 0]]
+        while stack:
+            frame = stack[-1]
+            if frame[1]:
+                child = frame[1].pop()
+                stack.append([child, list(reversed(child.children())), 0])
+                continue
+            stack.pop()
+            (current, _, nested) = frame
+            if isinstance(current, OrganizedNotAppliedEquationRequirement):
+                self.__addFailure(current, nested)
+            if stack:
+                stack[-1][2] += nested + 1
+
+    def clusters(self):
+        return sorted(
+            self.__clusters.values(),
+            key=lambda c: (-c.failures, -c.cost, c.implication))
+
+    def write(self, f):
+        f.write('%8s %10s %8s %9s  %s\n' % ('failures', 'cost', 'nodes', 'equations', 'most failing equation'))
+        clusters = self.clusters()
+        for c in clusters:
+            (location, _) = max(c.equations.items(), key=lambda item: (item[1], item[0]))
+            f.write('%8d %10d %8d %9d  %s\n' % (c.failures, c.cost, c.nodes, len(c.equations), location))
+        for (i, c) in enumerate(clusters[:self.__top], 1):
+            f.write('\n#%d: %d failures, negated implication:\n' % (i, c.failures))
+            for line in c.implication.split('\n'):
+                f.write(INDENT + line + '\n')
+
+    def __addFailure(self, organized, cost):
+        requirement = organized.requirement()
+        implication = '\n'.join(requirement.negatedImplicationKore())
+        if not implication.strip():
+            implication = '\n'.join(requirement.requiresKore())
+        key = kore.normalizedHash(implication)
+        cluster = self.__clusters.get(key)
+        if cluster is None:
+            cluster = RequirementCluster(implication, kore.nodeCount(implication))
+            self.__clusters[key] = cluster
+        cluster.add(str(organized.main_entry().equationLocation()), cost)
+
+class RewriteRuleProfile(object):
+    def __init__(self, location):
+        self.__location = location
+        self.__attempts = 0
+        self.__applications = 0
+        self.__equations = 0
+
+    def location(self):
+        return self.__location
+
+    def attempts(self):
+        return self.__attempts
+
+    def applications(self):
+        return self.__applications
+
+    def equations(self):
+        return self.__equations
+
+    def addAttempt(self):
+        self.__attempts += 1
+
+    def addApplication(self):
+        self.__applications += 1
+
+    def addEquations(self, equations):
+        self.__equations += equations
+
+# Aggregates the rewrite steps per rewrite rule location. A step starts with
+# a DebugAttemptedRewriteRules entry and lasts until the next one; the
+# equation attempts logged during a step count towards each rule attempted in
+# it. Wasted attempts are those that did not apply.
+class RewriteReport(object):
+    def __init__(self, args):
+        self.__rules = {}
+        # The locations attempted in the current step.
+        self.__step = []
+        self.__step_equations = 0
+
+    def add(self, organized):
+        stack = [organized]
+        while stack:
+            current = stack.pop()
+            entry = current.main_entry()
+            if isinstance(entry, DebugAttemptedRewriteRules):
+                self.__endStep()
+                self.__step = [str(location) for location in entry.ruleLocations()]
+                for location in self.__step:
+                    self.__profile(location).addAttempt()
+            elif isinstance(entry, DebugAppliedRewriteRules):
+                for location in entry.ruleLocations():
+                    self.__profile(str(location)).addApplication()
+            elif type(current).__name__ in EquationProfile.OUTCOMES:
+                self.__step_equations += 1
+            stack.extend(reversed(current.children()))
+
+    def profiles(self):
+        return sorted(
+            self.__rules.values(),
+            key=lambda p: (-self.__equations(p), -p.attempts(), p.location()))
+
+    def write(self, f):
+        f.write(
+            '%8s %8s %8s %10s %10s  %s\n'
+            % ('attempts', 'applied', 'wasted', 'equations', 'per step', 'rule'))
+        for p in self.profiles():
+            wasted = max(p.attempts() - p.applications(), 0)
+            f.write(
+                '%8d %8d %7.1f%% %10d %10.1f  %s\n'
+                % ( p.attempts()
+                  , p.applications()
+                  , 100.0 * wasted / p.attempts() if p.attempts() else 0
+                  , self.__equations(p)
+                  , float(self.__equations(p)) / p.attempts() if p.attempts() else 0
+                  , p.location()
+                  ))
+
+    # Includes the current step, which may still grow when following a log.
+    def __equations(self, profile):
+        if profile.location() in self.__step:
+            return profile.equations() + self.__step_equations
+        return profile.equations()
+
+    def __endStep(self):
+        for location in self.__step:
+            self.__profile(location).addEquations(self.__step_equations)
+        self.__step = []
+        self.__step_equations = 0
+
+    def __profile(self, location):
+        profile = self.__rules.get(location)
+        if profile is None:
+            profile = RewriteRuleProfile(location)
+            self.__rules[location] = profile
+        return profile
+
+class RpcRequest(object):
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.method = None
+        self.start = None
+        self.end = None
+        self.request_size = 0
+        self.response_size = 0
+
+    def add(self, entry):
+        if self.method is None:
+            self.method = entry.method()
+        timestamp = entry.timestamp()
+        if self.start is None:
+            self.start = timestamp
+        if entry.isResponse():
+            self.response_size += entry.payloadSize()
+            self.end = timestamp
+        else:
+            self.request_size += entry.payloadSize()
+
+    def methodName(self):
+        return self.method or '?'
+
+    def latency(self):
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+# Correlates the JSON-RPC entries by request id: a request starts with the
+# first entry that has its id and ends with the response. Latencies are in
+# the unit of the timestamps in the entry headers, and are missing when the
+# headers have none.
+class RpcReport(object):
+    SLOWEST = 20
+
+    def __init__(self, args):
+        # The requests without a response, by id.
+        self.__open = {}
+        # method -> (request sizes, response sizes, latencies)
+        self.__methods = {}
+        # (latency, order, request) for the slowest requests.
+        self.__slowest = []
+        self.__answered = 0
+
+    def add(self, organized):
+        stack = [organized]
+        while stack:
+            current = stack.pop()
+            entry = current.main_entry()
+            if isinstance(entry, JsonRpcEntry) and entry.requestId() is not None:
+                self.__addEntry(entry)
+            stack.extend(reversed(current.children()))
+
+    def write(self, f):
+        unanswered = {}
+        for request in self.__open.values():
+            unanswered[request.methodName()] = unanswered.get(request.methodName(), 0) + 1
+        f.write(
+            '%8s %10s  %-25s  %-25s  %-25s %12s  %s\n'
+            % ( 'requests', 'unanswered'
+              , 'request size p50/p90/max', 'response size p50/p90/max'
+              , 'latency p50/p90/max', 'total'
+              , 'method'
+              ))
+        methods = set(self.__methods.keys()) | set(unanswered.keys())
+        def total(method):
+            (_, _, latencies) = self.__methods.get(method, ([], [], []))
+            return sum(latencies)
+        for method in sorted(methods, key=lambda m: (-total(m), m)):
+            (request_sizes, response_sizes, latencies) = self.__methods.get(method, ([], [], []))
+            f.write(
+                '%8d %10d  %-25s  %-25s  %-25s %12s  %s\n'
+                % ( len(request_sizes)
+                  , unanswered.get(method, 0)
+                  , distribution(request_sizes, '%d')
+                  , distribution(response_sizes, '%d')
+                  , distribution(latencies, '%g')
+                  , '%g' % total(method) if latencies else '-'
+                  , method
+                  ))
+        if self.__slowest:
+            f.write('\nSlowest requests:\n')
+            f.write('%12s %10s %10s  %-20s %s\n' % ('latency', 'request', 'response', 'id', 'method'))
+            for (latency, _, request) in sorted(self.__slowest, reverse=True):
+                f.write(
+                    '%12g %10d %10d  %-20s %s\n'
+                    % ( latency, request.request_size, request.response_size
+                      , request.request_id, request.methodName()
+                      ))
+
+    def __addEntry(self, entry):
+        request = self.__open.get(entry.requestId())
+        if request is None:
+            request = RpcRequest(entry.requestId())
+            self.__open[entry.requestId()] = request
+        request.add(entry)
+        if entry.isResponse():
+            del self.__open[entry.requestId()]
+            self.__finish(request)
+
+    def __finish(self, request):
+        stats = self.__methods.get(request.methodName())
+        if stats is None:
+            stats = ([], [], [])
+            self.__methods[request.methodName()] = stats
+        (request_sizes, response_sizes, latencies) = stats
+        request_sizes.append(request.request_size)
+        response_sizes.append(request.response_size)
+        latency = request.latency()
+        self.__answered += 1
+        if latency is None:
+            return
+        latencies.append(latency)
+        item = (latency, self.__answered, request)
+        if len(self.__slowest) < RpcReport.SLOWEST:
+            heapq.heappush(self.__slowest, item)
+        else:
+            heapq.heappushpop(self.__slowest, item)
+
+# 'p50/p90/max' of the values, formatted with 'value_format'.
+def distribution(values, value_format):
+    if not values:
+        return '-'
+    values = sorted(values)
+    return '/'.join([
+        value_format % values[int(fraction * (len(values) - 1))]
+        for fraction in [0.5, 0.9, 1]])
+
+# The equation profile of a log, per equation. With 'rule_texts', equations
+# are keyed by their text in the K source instead of their location, so that
+# the profiles of logs produced before and after moving rules can be compared.
+class ComparedProfile(object):
+    def __init__(self, location):
+        self.location = location
+        self.attempts = 0
+        self.applied = 0
+        self.inclusive = 0
+
+    def add(self, profile):
+        self.attempts += profile.attempts()
+        self.applied += profile.outcome(EquationProfile.APPLIED)
+        self.inclusive += profile.inclusive()
+
+    def failed(self):
+        return self.attempts - self.applied
+
+def comparedProfiles(report, rule_texts):
+    profiles = {}
+    for p in report.profiles():
+        if rule_texts is None:
+            key = p.location()
+        else:
+            key = rule_texts.text(p.location())
+        compared = profiles.get(key)
+        if compared is None:
+            compared = ComparedProfile(p.location())
+            profiles[key] = compared
+        compared.add(p)
+    return profiles
+
+# Whitespace-normalized rule texts read from the K sources, by location. The
+# location itself is used when its source can't be read.
+class RuleTexts(object):
+    def __init__(self):
+        self.__texts = {}
+
+    def text(self, location):
+        text = self.__texts.get(location)
+        if text is None:
+            text = location
+            try:
+                l = FileLocation.parse(location)
+                if l.endLine() >= 0:
+                    text = ' '.join(filesequence.findSequence(
+                        l.fileName(), l.startLine(), l.startColumn(), l.endLine(), l.endColumn(), ' '
+                        ).split())
+            except (OSError, ValueError, IndexError, AssertionError):
+                pass
+            self.__texts[location] = text
+        return text
+
+# Compares the equation profiles of two logs of the same proof. Writes the
+# totals and the equations whose cost changed most, and returns True if the
+# attempts or the inclusive cost grew by more than 'max_increase' percent.
+def compareProfiles(base_report, new_report, rule_texts, top, max_increase, f):
+    base = comparedProfiles(base_report, rule_texts)
+    new = comparedProfiles(new_report, rule_texts)
+    empty = ComparedProfile(None)
+
+    totals = []
+    for (name, value) in [
+            ('attempts', lambda p: p.attempts),
+            ('applied', lambda p: p.applied),
+            ('failed', lambda p: p.failed()),
+            ('inclusive', lambda p: p.inclusive),
+            ]:
+        base_total = sum([value(p) for p in base.values()])
+        new_total = sum([value(p) for p in new.values()])
+        totals.append((name, base_total, new_total))
+        f.write('%-10s %10d -> %10d  %s\n' % (name, base_total, new_total, percentChange(base_total, new_total)))
+    f.write('\n')
+
+    rows = []
+    for key in set(base.keys()) | set(new.keys()):
+        b = base.get(key, empty)
+        n = new.get(key, empty)
+        location = n.location if n.location is not None else b.location
+        rows.append((b, n, location))
+    rows.sort(key=lambda row: (
+        -abs(row[1].attempts - row[0].attempts),
+        -abs(row[1].inclusive - row[0].inclusive),
+        row[2]))
+    f.write(
+        '%10s %10s %8s %8s %8s %10s  %s\n'
+        % ('base', 'new', 'attempts', 'applied', 'failed', 'inclusive', 'equation'))
+    for (b, n, location) in rows[:top]:
+        f.write(
+            '%10d %10d %+8d %+8d %+8d %+10d  %s\n'
+            % ( b.attempts, n.attempts
+              , n.attempts - b.attempts
+              , n.applied - b.applied
+              , n.failed() - b.failed()
+              , n.inclusive - b.inclusive
+              , location
+              ))
+
+    if max_increase is None:
+        return False
+    regressed = False
+    for (name, base_total, new_total) in totals:
+        if name in ('attempts', 'inclusive') and new_total > base_total * (1 + max_increase / 100.0):
+            print(
+                'Regression: %s grew from %d to %d, more than %g%%.' % (name, base_total, new_total, max_increase),
+                file=sys.stderr)
+            regressed = True
+    return regressed
+
+def percentChange(base, new):
+    if base == 0:
+        return '' if new == 0 else 'new'
+    return '%+.1f%%' % (100.0 * (new - base) / base)
+
+def organizedName(organized):
+    entry = organized.main_entry()
+    if isinstance(entry, DebugAttemptEquation):
+        return str(entry.equationLocation())
+    return type(entry).__name__
+
+def foldedFrame(name):
+    # Flame graph tools split stacks on ';' and the weight on the last space.
+    return name.replace(';', ',').replace('\n', ' ')
+
+REPORTS = {
+    'folded': FoldedReport,
+    'growth': GrowthReport,
+    'profile': ProfileReport,
+    'requirements': RequirementReport,
+    'rewrite': RewriteReport,
+    'rpc': RpcReport,
+}
 
 def writeLog(entries, out):
     for e in entries:
         e.write(0, 0, out)
         out.append('\n')
 
+def streamLog(entries, f):
+    for e in entries:
+        f.writelines(organizedText(e))
+        f.write('\n')
+
+def streamRecords(entries, f):
+    ids = itertools.count()
+    for e in entries:
+        f.writelines(organizedRecords(e, ids))
+
+FORMATS = {
+    'jsonl': streamRecords,
+    'text': streamLog,
+}
+
 def main(argv):
-    if len(argv) != 2:
-        print('Usage:\n    logparser.py input-file output-file')
-        sys.exit(1)
-    with open(argv[0], 'r') as f:
-        contents = f.read()
-    entries = parse(contents)
-    organized = parseFunctionApplication(entries)
-
-    out = []
-    writeLog(organized, out)
-    with open(argv[1], 'w') as f:
-        f.write(''.join(out))
+    parser = argparse.ArgumentParser(prog='logparser.py')
+    parser.add_argument('input', help='kore-rpc or kore-repl log file')
+    parser.add_argument('output', help='file for the organized log')
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help='number of processes that parse the log')
+    parser.add_argument(
+        '--report', choices=sorted(REPORTS.keys()),
+        help='write this report instead of the organized log')
+    parser.add_argument(
+        '--format', choices=sorted(FORMATS.keys()), default='text',
+        help='layout of the organized log, jsonl writes one JSON record per organized entry')
+    parser.add_argument(
+        '--equation',
+        help='only top-level entries with an attempt of the equation at this location, e.g. foo.k:326:8')
+    parser.add_argument(
+        '--entry-type',
+        help='only top-level entries containing an entry of this type, e.g. EquationIsNotApplicableRequirement')
+    parser.add_argument(
+        '--context',
+        help='only top-level entries containing a context line with this text')
+    parser.add_argument(
+        '--tolerant', action='store_true',
+        help='skip the entries that can not be parsed or organized instead of stopping, and list them at the end')
+    parser.add_argument(
+        '--follow', action='store_true',
+        help='keep reading the log as it grows, until Ctrl-C, updating the output')
+    parser.add_argument(
+        '--weight', choices=sorted(FoldedReport.WEIGHTS.keys()), default='entries',
+        help='for the folded report, count nested entries or the kore nodes of the attempted terms')
+    parser.add_argument(
+        '--rule-index', metavar='DATABASE',
+        help='rule index made by ruleindex.py, for rule labels in the profile report and rule texts with --match-rule-text')
+    parser.add_argument(
+        '--compare', metavar='BASE',
+        help='compare the equation profile of the input with the one of this earlier log of the same proof')
+    parser.add_argument(
+        '--match-rule-text', action='store_true',
+        help='with --compare, match equations by their text in the K sources instead of their location')
+    parser.add_argument(
+        '--top', type=int, default=30,
+        help='the number of equations to list with --compare, or of implications to print with --report requirements')
+    parser.add_argument(
+        '--max-increase', type=float, metavar='PERCENT',
+        help='with --compare, exit with status 1 if the equation attempts or their inclusive cost grew by more than this')
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('--jobs must be positive')
+    if args.follow and args.jobs > 1:
+        parser.error('--follow reads the log in a single process, it can not be used with --jobs')
+    if args.follow and args.compare is not None:
+        parser.error('--compare needs complete logs, it can not be used with --follow')
+    if args.compare is not None and args.report is not None:
+        parser.error('--compare writes its own report, it can not be used with --report')
+    if args.format != 'text' and (args.report is not None or args.compare is not None):
+        parser.error('--format is the layout of the organized log, it can not be used with reports')
+    if (args.follow or args.jobs > 1) and compressedio.isCompressed(args.input):
+        parser.error('compressed logs can only be read sequentially, without --follow or --jobs')
+    if args.rule_index is not None and not os.path.exists(args.rule_index):
+        parser.error('no rule index at %s' % args.rule_index)
+
+    if args.rule_index is not None:
+        filesequence.RESOLVER.setIndex(ruleindex.RuleIndex(args.rule_index))
+    skipped = {} if args.tolerant else None
+    entry_filter = EntryFilter(args.equation, args.entry_type, args.context)
+    if entry_filter.isEmpty():
+        entry_filter = None
+    if args.compare is not None:
+        reports = []
+        for path in [args.compare, args.input]:
+            report = ProfileReport(args)
+            for o in readOrganized(path, args, entry_filter, skipped):
+                report.add(o)
+            reports.append(report)
+        rule_texts = RuleTexts() if args.match_rule_text else None
+        with open(args.output, 'w', buffering=OUTPUT_BUFFER_SIZE) as output:
+            regressed = compareProfiles(reports[0], reports[1], rule_texts, args.top, args.max_increase, output)
+        printSkipped(skipped)
+        if regressed:
+            sys.exit(1)
+        return
+
+    if args.follow:
+        report = None if args.report is None else REPORTS[args.report](args)
+        with open(args.input, 'rb') as f, open(args.output, 'w', buffering=OUTPUT_BUFFER_SIZE) as output:
+            follower = LogFollower(LogSource(f))
+            entries = parseEntries(follower.entryLines(), args.tolerant, entry_filter)
+            try:
+                process(args, organize(entries, skipped), output, follower, report)
+            except KeyboardInterrupt:
+                # Ctrl-C stops following the log. The follower ends the log
+                # when it comes while waiting for new lines, otherwise the
+                # output keeps the entries processed until then.
+                if report is not None:
+                    rewriteReport(report, output)
+    else:
+        with open(args.output, 'w', buffering=OUTPUT_BUFFER_SIZE) as output:
+            process(args, readOrganized(args.input, args, entry_filter, skipped), output)
+    printSkipped(skipped)
+
+# The organized entries of the log at 'path', parsed with args.jobs
+# processes unless the log is compressed.
+def readOrganized(path, args, entry_filter, skipped):
+    if compressedio.isCompressed(path):
+        # Compressed logs can't be mapped, their entries keep their kore
+        # terms as lines.
+        entries = parseEntries(entryLines(compressedio.readLines(path)), args.tolerant, entry_filter)
+        yield from organize(entries, skipped)
+        return
+    with open(path, 'rb') as f:
+        source = LogSource(f)
+        if args.jobs > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                entries = parseEntriesInParallel(source, pool, args.jobs, args.tolerant, entry_filter)
+                yield from organize(entries, skipped)
+        else:
+            entries = parseEntries(source.entryLines(), args.tolerant, entry_filter)
+            yield from organize(entries, skipped)
+
+def printSkipped(skipped):
+    if skipped:
+        print('Skipped entries:', file=sys.stderr)
+        for ((entry_type, reason), count) in sorted(skipped.items(), key=lambda item: (-item[1], str(item[0]))):
+            print('%10d %s: %s' % (count, entry_type, reason), file=sys.stderr)
+
+# With a follower, the output is brought up to date each time the follower
+# waits for new lines. 'report' is the report to fill for args.report, a new
+# one if None.
+def process(args, organized, output, follower=None, report=None):
+    if args.report is None:
+        if follower is not None:
+            follower.addIdleListener(output.flush)
+        FORMATS[args.format](organized, output)
+        return
+    if report is None:
+        report = REPORTS[args.report](args)
+    if follower is not None:
+        follower.addIdleListener(lambda: rewriteReport(report, output))
+    for o in organized:
+        report.add(o)
+    rewriteReport(report, output)
+
+def rewriteReport(report, f):
+    f.seek(0)
+    f.truncate()
+    report.write(f)
+    f.flush()
 
 if __name__ == '__main__':
     main(sys.argv[1:])
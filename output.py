@@ -106,7 +106,7 @@ class OutputParser:
 
   BYTES_PREFIX = b'\x00\xff\x00'
 
-  def __init__(self, handler, log, message_thread):
+  def __init__(self, handler, log, message_thread, pool):
     self.__state = OutputParser.STARTING
     self.__substate = OutputParser.STATE_START
     self.__number = 0
@@ -119,6 +119,7 @@ class OutputParser:
     self.__log = log
     self.__handler = handler
     self.__message_thread = message_thread
+    self.__pool = pool
     self.__string_finder = StringFinder(
         [
             (b'\nKore (', OutputParser.STR_PROMPT_Kore_p),
@@ -201,6 +202,11 @@ class OutputParser:
       return True
     return False
 
+  def __onKonfigNormalized(self, konfig_number, future):
+    (normalized, cell_index) = future.result()
+    self.__log.write(bytes('onKonfig(%d, [%s, ...])' % (konfig_number, normalized), 'ascii'))
+    self.__handler.onKonfig(konfig_number, normalized, cell_index)
+
   def __processNumber(self, byte, string_finder):
     if self.__substate == OutputParser.STATE_NUMBER:
       if b'0' <= byte and byte <= b'9':
@@ -218,13 +224,12 @@ class OutputParser:
     if self.__processPromptState(found):
       if self.__substate == OutputParser.STATE_START:
         assert self.__konfig_lines
-        normalized = konfig.normalize(self.__konfig_lines)
-        self.__log.write(bytes('onKonfig(%d, [%s, ...])' % (self.__konfig_number, normalized), 'ascii'))
-        self.__message_thread.add(
-            self.__handler.onKonfig,
-            self.__konfig_number,
-            normalized
-        )
+        # Normalizing a large konfig takes a while, it should not block reading
+        # the rest of the output.
+        future = self.__pool.submit(konfig.normalizeAndIndex, self.__konfig_lines)
+        future.add_done_callback(
+            lambda f, number=self.__konfig_number:
+                self.__message_thread.add(self.__onKonfigNormalized, number, f))
       return
     if self.__processNumber(byte, self.__konfig_string_finder):
       return
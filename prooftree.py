@@ -1,3 +1,4 @@
+import konfig
 import messages
 
 class Node:
@@ -11,6 +12,7 @@ class Node:
     self.__number = number
     self.__state = Node.NORMAL
     self.__konfig = []
+    self.__cell_index = konfig.CellIndex([])
     self.__ui_data = ui_data
     self.__change_listeners = messages.Listeners()
     self.__ui_data.getChangeListeners().add(self.__change_listeners.notify)
@@ -34,11 +36,15 @@ class Node:
     else:
       return ['Not loaded yet.']
 
+  def getCellIndex(self):
+    return self.__cell_index
+
   def hasKonfig(self):
     return bool(self.__konfig)
 
-  def setKonfig(self, konfig):
-    self.__konfig = konfig
+  def setKonfig(self, konfig_lines, cell_index):
+    self.__konfig = konfig_lines
+    self.__cell_index = cell_index
     self.__change_listeners.notify()
 
   def __str__(self):
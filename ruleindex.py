@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+# Indexes the sentences of a K definition by their source location, so that
+# locations like 'execution-proof-helpers.k:326:8-330:64' in logs can be
+# resolved without reading the sources again.
+#
+#     ruleindex.py index ROOT DATABASE
+#     ruleindex.py lookup DATABASE LOCATION
+#
+# Indexing again only rescans the files whose hash changed. Lookups match
+# the file by its absolute path or, for logs produced elsewhere, by its path
+# relative to ROOT, and ignore the files that changed since they were indexed.
+
+import argparse
+import bisect
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+
+import filesequence
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        relative TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        hash TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS rules (
+        file INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        start_line INTEGER NOT NULL,
+        start_column INTEGER NOT NULL,
+        end_line INTEGER NOT NULL,
+        end_column INTEGER NOT NULL,
+        label TEXT,
+        attributes TEXT,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS files_relative ON files (relative);
+    CREATE INDEX IF NOT EXISTS rules_location ON rules (file, start_line, start_column);
+'''
+
+SOURCE_SUFFIX = '.k'
+
+# Keywords that start a sentence when they are the first word on their line.
+SENTENCES = {'rule', 'claim', 'context', 'syntax', 'configuration'}
+OTHER_KEYWORDS = {'module', 'endmodule', 'imports'}
+
+# Comments, strings and words; anything else is a single character.
+TOKEN = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:[^"\\\n]|\\.)*"|[A-Za-z0-9_#$\']+|\S', re.DOTALL)
+LABEL = re.compile(r'^\w+\s*\[([^\]\s]+)\]\s*:')
+
+class Rule(object):
+    def __init__(self, kind, start_line, start_column, end_line, end_column, label, attributes, text):
+        self.kind = kind
+        self.start_line = start_line
+        self.start_column = start_column
+        self.end_line = end_line
+        self.end_column = end_column
+        self.label = label
+        self.attributes = attributes
+        self.text = text
+
+    def location(self):
+        return '%d:%d-%d:%d' % (self.start_line, self.start_column, self.end_line, self.end_column)
+
+# Splits a K source into sentences. A sentence starts with its keyword and
+# ends with its last token before the next keyword, as K locations do; end
+# columns are inclusive.
+def scanRules(text):
+    line_starts = [0] + [m.end() for m in re.finditer('\n', text)]
+    def position(offset):
+        line = bisect.bisect_right(line_starts, offset)
+        return (line, offset - line_starts[line - 1] + 1)
+
+    rules = []
+    # (kind, start offset) of the sentence being read.
+    current = None
+    last_end = None
+    for m in TOKEN.finditer(text):
+        token = m.group(0)
+        if token.startswith('//') or token.startswith('/*'):
+            continue
+        if token in SENTENCES or token in OTHER_KEYWORDS:
+            line_start = text.rfind('\n', 0, m.start()) + 1
+            if not text[line_start:m.start()].strip():
+                if current is not None:
+                    rules.append(makeRule(text, current, last_end, position))
+                current = (token, m.start()) if token in SENTENCES else None
+        last_end = m.end()
+    if current is not None:
+        rules.append(makeRule(text, current, last_end, position))
+    return rules
+
+def makeRule(text, current, end, position):
+    (kind, start) = current
+    sentence = text[start:end]
+    (start_line, start_column) = position(start)
+    (end_line, end_column) = position(end - 1)
+    label = LABEL.match(sentence)
+    return Rule(
+        kind, start_line, start_column, end_line, end_column,
+        label.group(1) if label else None, attributes(sentence), sentence)
+
+# The text between the brackets that end the sentence, if any.
+def attributes(sentence):
+    if not sentence.endswith(']'):
+        return None
+    depth = 0
+    for i in range(len(sentence) - 1, -1, -1):
+        if sentence[i] == ']':
+            depth += 1
+        elif sentence[i] == '[':
+            depth -= 1
+            if depth == 0:
+                label = LABEL.match(sentence)
+                if label and i < label.end():
+                    return None
+                return sentence[i + 1:-1].strip()
+    return None
+
+def fileHash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def sourceFiles(root):
+    for (directory, _, names) in os.walk(root):
+        for name in sorted(names):
+            if name.endswith(SOURCE_SUFFIX):
+                yield os.path.join(directory, name)
+
+def index(root, db_path):
+    root = os.path.abspath(root)
+    db = sqlite3.connect(db_path)
+    db.executescript(SCHEMA)
+    known = {}
+    for (file_id, path, size, mtime, h) in db.execute('SELECT id, path, size, mtime, hash FROM files'):
+        known[path] = (file_id, size, mtime, h)
+    seen = set()
+    (scanned, unchanged) = (0, 0)
+    for path in sourceFiles(root):
+        seen.add(path)
+        stat = os.stat(path)
+        old = known.get(path)
+        if old is not None and (old[1], old[2]) == (stat.st_size, stat.st_mtime):
+            unchanged += 1
+            continue
+        h = fileHash(path)
+        if old is not None and old[3] == h:
+            db.execute('UPDATE files SET size = ?, mtime = ? WHERE id = ?', (stat.st_size, stat.st_mtime, old[0]))
+            unchanged += 1
+            continue
+        if old is not None:
+            removeFile(db, old[0])
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        file_id = db.execute(
+            'INSERT INTO files (path, relative, size, mtime, hash) VALUES (?, ?, ?, ?, ?)',
+            (path, os.path.relpath(path, root), stat.st_size, stat.st_mtime, h)).lastrowid
+        db.executemany(
+            '''INSERT INTO rules
+                (file, kind, start_line, start_column, end_line, end_column, label, attributes, text)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [ (file_id, r.kind, r.start_line, r.start_column, r.end_line, r.end_column, r.label, r.attributes, r.text)
+              for r in scanRules(text)
+            ])
+        scanned += 1
+    removed = 0
+    for (path, (file_id, _, _, _)) in known.items():
+        if path.startswith(root + os.sep) and path not in seen:
+            removeFile(db, file_id)
+            removed += 1
+    db.commit()
+    db.close()
+    print('%d files scanned, %d unchanged, %d removed.' % (scanned, unchanged, removed))
+
+def removeFile(db, file_id):
+    db.execute('DELETE FROM rules WHERE file = ?', (file_id,))
+    db.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+class RuleIndex(object):
+    def __init__(self, db_path):
+        if not os.path.exists(db_path):
+            # sqlite3 would create an empty index instead.
+            raise FileNotFoundError('No rule index at %s' % db_path)
+        self.__db = sqlite3.connect(db_path)
+        # file name -> file id, None if it is not indexed or changed.
+        self.__files = {}
+
+    # The sentence that starts at this position, or None.
+    def rule(self, file_name, start_line, start_column):
+        file_id = self.__fileId(file_name)
+        if file_id is None:
+            return None
+        row = self.__db.execute(
+            '''SELECT kind, start_line, start_column, end_line, end_column, label, attributes, text
+                FROM rules WHERE file = ? AND start_line = ? AND start_column = ?''',
+            (file_id, start_line, start_column)).fetchone()
+        if row is None:
+            return None
+        return Rule(*row)
+
+    # The lines of the source between the two positions, if they are those
+    # of an indexed sentence, otherwise None.
+    def sequence(self, file_name, start_line, start_column, end_line, end_column):
+        rule = self.rule(file_name, start_line, start_column)
+        if rule is None or (rule.end_line, rule.end_column) != (end_line, end_column):
+            return None
+        return rule.text.split('\n')
+
+    def __fileId(self, file_name):
+        if file_name in self.__files:
+            return self.__files[file_name]
+        row = self.__db.execute(
+            'SELECT id, path, size, mtime, hash FROM files WHERE path = ?', (file_name,)).fetchone()
+        if row is None:
+            # The longest indexed relative path that ends the file name. LIKE
+            # would treat '_' and '%' in the names as wildcards and ignore case.
+            for candidate in self.__db.execute(
+                    '''SELECT id, path, size, mtime, hash FROM files
+                        WHERE substr(?, -length(relative) - 1) = '/' || relative OR ? = relative
+                        ORDER BY length(relative) DESC LIMIT 1''',
+                    (file_name, file_name)):
+                row = candidate
+        file_id = None
+        if row is not None and self.__unchanged(*row[1:]):
+            file_id = row[0]
+        self.__files[file_name] = file_id
+        return file_id
+
+    def __unchanged(self, path, size, mtime, h):
+        if not os.path.exists(path):
+            # Indexed elsewhere, there is nothing to compare with.
+            return True
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime) == (size, mtime):
+            return True
+        if fileHash(path) == h:
+            return True
+        print('Warning: %s changed after it was indexed.' % path, file=sys.stderr)
+        return False
+
+def lookup(db_path, location):
+    (file_name, start_line, start_column, end_line, end_column) = filesequence.parsePosition(location)
+    rule = RuleIndex(db_path).rule(file_name, start_line, start_column)
+    if rule is None:
+        print('No indexed sentence starts at %s.' % location)
+        return
+    print('%s at %s' % (rule.kind, rule.location()))
+    if (rule.end_line, rule.end_column) != (end_line, end_column):
+        print('Warning: the indexed sentence ends at %d:%d.' % (rule.end_line, rule.end_column))
+    print('label: %s' % rule.label)
+    print('attributes: %s' % rule.attributes)
+    print(rule.text)
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='ruleindex.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = commands.add_parser('index', help='index or reindex the K files under a directory')
+    index_parser.add_argument('root')
+    index_parser.add_argument('database')
+
+    lookup_parser = commands.add_parser('lookup', help='print the sentence at a location')
+    lookup_parser.add_argument('database')
+    lookup_parser.add_argument('location', help='e.g. foo.k:326:8-330:64')
+
+    args = parser.parse_args(argv)
+    if args.command == 'lookup' and not os.path.exists(args.database):
+        parser.error('no rule index at %s' % args.database)
+    if args.command == 'index':
+        index(args.root, args.database)
+    elif args.command == 'lookup':
+        lookup(args.database, args.location)
+    else:
+        assert False, args.command
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,5 +1,6 @@
 import curses
 import indent
+import konfig
 import time
 
 import messages
@@ -8,7 +9,36 @@ import messages
 #           Display
 #-------------------------------------
 
+class LazyLines:
+  def __init__(self, lines):
+    if type(lines) == list:
+      self.__lines = lines
+      self.__iterator = None
+    else:
+      self.__lines = []
+      self.__iterator = iter(lines)
+
+  def ensure(self, count):
+    while self.__iterator is not None and len(self.__lines) < count:
+      try:
+        self.__lines.append(next(self.__iterator))
+      except StopIteration:
+        self.__iterator = None
+
+  def ensureAll(self):
+    while self.__iterator is not None:
+      self.ensure(len(self.__lines) + 1)
+
+  def __len__(self):
+    return len(self.__lines)
+
+  def __getitem__(self, index):
+    return self.__lines[index]
+
 class Window:
+  # How many pages after the visible one are computed in advance.
+  PRELOADED_PAGES = 1
+
   def __init__(self, window, assertOnUIThread):
     self.__offsetX = 0
     self.__offsetY = 0
@@ -18,7 +48,7 @@ class Window:
     self.__maxX = 0
     self.__maxY = 0
     self.__window = window
-    self.__lines = []
+    self.__lines = LazyLines([])
     self.__line_change_listeners = []
     self.__focused = False
     self.__title = 'Title'
@@ -95,6 +125,7 @@ class Window:
   def down_UI(self):
     self._assertOnUIThread()
     self.assertConsistent_UI()
+    self.__lines.ensure(self.__currentY + 2)
     if self.__currentY == len(self.__lines) - 1 or (not self.__lines):
       return
     self.__currentY += 1
@@ -107,9 +138,18 @@ class Window:
     self._assertOnUIThread()
     pass
 
+  def select_UI(self):
+    self._assertOnUIThread()
+    pass
+
+  def project_UI(self):
+    self._assertOnUIThread()
+    pass
+
   def nextPage_UI(self):
     self._assertOnUIThread()
     self.assertConsistent_UI()
+    self.__lines.ensure(self.__offsetY + 2 * self.availableY_UI())
     max_line = len(self.__lines) - 1
     if self.__currentY == max_line or (not self.__lines):
       return
@@ -134,6 +174,7 @@ class Window:
   def end_UI(self):
     self._assertOnUIThread()
     self.assertConsistent_UI()
+    self.__lines.ensureAll()
     try:
       self.__currentY = len(self.__lines) - 1
       if self.__currentY < 0:
@@ -155,7 +196,10 @@ class Window:
     self._assertOnUIThread()
     self.assertConsistent_UI()
 
+    if not isinstance(lines, LazyLines):
+      lines = LazyLines(lines)
     self.__lines = lines
+    lines.ensure(self.__offsetY + (1 + Window.PRELOADED_PAGES) * self.availableY_UI())
 
     lines_len = len(lines)
     if self.__offsetY >= lines_len:
@@ -168,7 +212,8 @@ class Window:
       if self.__currentY < 0:
         self.__currentY = 0
     self.clear_UI()
-    for y in range(0, lines_len):
+    last_visible = min(lines_len, self.__offsetY + self.availableY_UI())
+    for y in range(self.__offsetY, last_visible):
       self.print_UI(0, y, lines[y])
 
     self.assertConsistent_UI()
@@ -233,6 +278,10 @@ class Window:
       message = message[:self.availableX_UI() - x]
     self.__window.addstr(y + self.__minY + 1, x + self.__minX + 1, message, attr)
 
+  def currentLine_UI(self):
+    self._assertOnUIThread()
+    return self.__currentY
+
   def availableX_UI(self):
     self._assertOnUIThread()
     return self.__maxX - self.__minX - 1
@@ -369,24 +418,94 @@ class SubTreeWindow(Window):
       listener(node_id)
 
 class KonfigWindow(Window):
-  def __init__(self, stdscr, node_tree, ui_message_thread, message_thread, handler, assertOnUIThread):
+  # Cells that are shown collapsed until expanded with Space.
+  COLLAPSED_CELLS = []
+  # Innermost cells with more characters than this are also collapsed by
+  # default.
+  COLLAPSED_CELL_MIN_SIZE = 20000
+  # Konfig lines with more characters than this are formatted in the worker
+  # processes, a placeholder is shown until they are ready.
+  BACKGROUND_FORMAT_MIN_SIZE = 2000
+
+  def __init__(self, stdscr, node_tree, ui_message_thread, message_thread, pool, handler, assertOnUIThread):
     super(KonfigWindow, self).__init__(stdscr, assertOnUIThread)
     self.__node_tree = node_tree
     self.__node_id = node_tree.getId()
     self.__message_thread = message_thread
     self.__handler = handler
     self.__ui_message_thread = ui_message_thread
-    self.__ui_message_thread.add(self.setTitle_UI, str(self.__node_tree.findNode(self.__node_id)))
+    self.__pool = pool
+    self.__change_listeners = messages.Listeners()
+    # (line, max_len, indent) -> formatted lines, for __formatted_konfig.
+    self.__formatted = {}
+    # Keys submitted to the pool whose lines did not arrive yet.
+    self.__formatting = set()
+    self.__formatted_konfig = None
+    self.__layout_konfig = None
+    self.__layout_cell_index = konfig.CellIndex([])
+    self.__layout_width = 0
+    self.__lines = LazyLines([])
+    self.__line_cells = []
+    # Cell path -> collapsed, for the cells that were toggled by the user.
+    self.__collapsed = {}
+    # Paths of the cells shown when only selected cells are shown.
+    self.__selected_cells = []
+    self.__only_selected = False
+    self.__ui_message_thread.add(self.__updateTitle)
 
   def draw_UI(self, xMin, yMin, xMax, yMax):
     self._assertOnUIThread()
     self.setCoords_UI(xMin, yMin, xMax, yMax)
-    lines = []
-    self.__printKonfig(
-        self.__node_tree.findNode(self.__node_id),
-        self.availableX_UI(),
-        lines)
-    self.setDrawLines_UI(lines)
+    node = self.__node_tree.findNode(self.__node_id)
+    konfig_lines = node.getKonfig()
+    width = self.availableX_UI()
+    if konfig_lines is not self.__formatted_konfig:
+      self.__formatted = {}
+      self.__formatting = set()
+      self.__formatted_konfig = konfig_lines
+    if konfig_lines is not self.__layout_konfig or width != self.__layout_width:
+      self.__layout_konfig = konfig_lines
+      self.__layout_cell_index = node.getCellIndex()
+      self.__layout_width = width
+      self.__line_cells = []
+      if self.__only_selected and self.__selected_cells and node.hasKonfig():
+        lines = self.__layoutSelected(node.getCellIndex(), width)
+      else:
+        lines = self.__layout(konfig_lines, width)
+      self.__lines = LazyLines(lines)
+    self.setDrawLines_UI(self.__lines)
+
+  def getChangeListeners(self):
+    return self.__change_listeners
+
+  def space_UI(self):
+    self._assertOnUIThread()
+    line = self.currentLine_UI()
+    if line >= len(self.__line_cells) or self.__line_cells[line] is None:
+      return
+    (path, collapsed) = self.__line_cells[line]
+    self.__collapsed[path] = not collapsed
+    self.__layout_konfig = None
+
+  def select_UI(self):
+    self._assertOnUIThread()
+    line = self.currentLine_UI()
+    if line >= len(self.__line_cells) or self.__line_cells[line] is None:
+      return
+    (path, _) = self.__line_cells[line]
+    if path in self.__selected_cells:
+      self.__selected_cells.remove(path)
+    else:
+      self.__selected_cells.append(path)
+    self.__updateTitle()
+    if self.__only_selected:
+      self.__layout_konfig = None
+
+  def project_UI(self):
+    self._assertOnUIThread()
+    self.__only_selected = not self.__only_selected
+    self.__updateTitle()
+    self.__layout_konfig = None
 
   def setNode(self, node_id):
     self.__node_id = node_id
@@ -395,12 +514,67 @@ class KonfigWindow(Window):
           self.__handler.requestKonfig,
           node_id
       )
-    self.__ui_message_thread.add(self.setTitle_UI, str(self.__node_tree.findNode(self.__node_id)))
+    self.__ui_message_thread.add(self.__updateTitle)
+
+  def __layout(self, konfig_lines, width):
+    for (line, cell) in indent.layout(konfig_lines, width, self.__isCollapsed, formatter=self.__format):
+      self.__line_cells.append(cell)
+      yield line
+
+  def __layoutSelected(self, cell_index, width):
+    for path in self.__selected_cells:
+      cell = cell_index.cell(path)
+      if cell is None:
+        self.__line_cells.append((path, False))
+        yield '%s: not in this konfig' % path
+        continue
+      for (line, cell) in indent.layout(cell, width, self.__isCollapsed, path, self.__format):
+        self.__line_cells.append(cell)
+        yield line
+
+  def __updateTitle(self):
+    title = str(self.__node_tree.findNode(self.__node_id))
+    if self.__only_selected:
+      title = '%s, %d selected cells' % (title, len(self.__selected_cells))
+    self.setTitle_UI(title)
+
+  def __format(self, max_len, indent_level, line):
+    if len(line) <= KonfigWindow.BACKGROUND_FORMAT_MIN_SIZE:
+      return indent.formatLine(max_len, indent_level, line)
+    key = (line, max_len, indent_level)
+    if key in self.__formatted:
+      return self.__formatted[key]
+    if key not in self.__formatting:
+      self.__formatting.add(key)
+      future = self.__pool.submit(indent.formatLine, max_len, indent_level, line)
+      future.add_done_callback(
+          lambda f: self.__ui_message_thread.add(self.__onFormatted_UI, key, f))
+    return None
+
+  def __onFormatted_UI(self, key, future):
+    self._assertOnUIThread()
+    self.__formatting.discard(key)
+    try:
+      self.__formatted[key] = future.result()
+    except Exception as e:
+      # Keeps the placeholder, the rest of the konfig can still be shown.
+      (line, _, indent_level) = key
+      self.__formatted[key] = [
+          '%s[formatting %d characters] failed: %s' % (indent.INDENTS[indent_level], len(line), e)]
+    self.__layout_konfig = None
+    self.__change_listeners.notify()
 
-  def __printKonfig(self, node, max_line_length, output):
-    konfig = node.getKonfig()
-    indented = indent.split(konfig, max_line_length)
-    indent.unparse(0, indented, output)
+  def __isCollapsed(self, path, contents):
+    if path in self.__collapsed:
+      return self.__collapsed[path]
+    name = path[path.rfind('/') + 1:]
+    if '#' in name:
+      name = name[:name.find('#')]
+    if name in KonfigWindow.COLLAPSED_CELLS:
+      return True
+    # Measured once per konfig, when it was indexed.
+    size = self.__layout_cell_index.leafSize(path)
+    return size is not None and size > KonfigWindow.COLLAPSED_CELL_MIN_SIZE
 
 class WindowEvents:
   def __init__(self, window, display, assertOnUIThread):
@@ -443,6 +617,16 @@ class WindowEvents:
     self.__window.space_UI()
     self.__display.update()
 
+  def select_UI(self):
+    self.__assertOnUIThread()
+    self.__window.select_UI()
+    self.__display.update()
+
+  def project_UI(self):
+    self.__assertOnUIThread()
+    self.__window.project_UI()
+    self.__display.update()
+
   def setFocused_UI(self, focused):
     self.__assertOnUIThread()
     self.__window.setFocused_UI(focused)
@@ -451,14 +635,15 @@ class Display:
   TREE_MIN_COLS = 60
   SUBTREE_MIN_COLS = 30
   WINDOW_MIN_COLS = 20
-  def __init__(self, stdscr, node_tree, graph, ui_message_thread, message_thread, handler, assertOnUIThread):
+  def __init__(self, stdscr, node_tree, graph, ui_message_thread, message_thread, pool, handler, assertOnUIThread):
     self.__stdscr = stdscr
     curses.curs_set(False)
     self.__tree_window = TreeWindow(stdscr, node_tree, graph, ui_message_thread, assertOnUIThread)
     self.__tree_window_events = WindowEvents(self.__tree_window, self, assertOnUIThread)
     self.__subtree_window = SubTreeWindow(stdscr, node_tree, graph, ui_message_thread, assertOnUIThread)
     self.__subtree_window_events = WindowEvents(self.__subtree_window, self, assertOnUIThread)
-    self.__konfig_window = KonfigWindow(stdscr, node_tree, ui_message_thread, message_thread, handler, assertOnUIThread)
+    self.__konfig_window = KonfigWindow(stdscr, node_tree, ui_message_thread, message_thread, pool, handler, assertOnUIThread)
+    self.__konfig_window.getChangeListeners().add(self.update)
     self.__konfig_window_events = WindowEvents(self.__konfig_window, self, assertOnUIThread)
     self.__current_window_index = 0
     self.__all_window_events = [
@@ -508,7 +693,7 @@ class Display:
     start_cols = end_cols + 1
     end_cols = cols - 1
     self.__konfig_window.draw_UI(start_cols, 0, end_cols, lines - 2)
-    self.__stdscr.addstr(lines - 1, 0, "F10-Quit  F9-Repaint")
+    self.__stdscr.addstr(lines - 1, 0, "F10-Quit  F9-Repaint  s-Select cell  p-Only selected cells")
     self.__stdscr.refresh()
 
   def tab_UI(self):